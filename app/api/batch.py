@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from typing import List
+from dotenv import load_dotenv
+
+from app.api.recommendation_agent import abatch_pet_recommendations
+from app.utils.clients import close_clients, warm_up
+
+load_dotenv()
+
+DEFAULT_BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+def load_quizzes(input_path: str) -> List[str]:
+    # JSON lines, each either {"formatted_quiz": "..."} or a bare JSON string
+    quizzes = []
+    with open(input_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            quizzes.append(item["formatted_quiz"] if isinstance(item, dict) else item)
+    return quizzes
+
+async def _run_batch(quizzes: List[str], output, max_concurrency: int) -> int:
+    warm_up()
+    count = 0
+    try:
+        async for result in abatch_pet_recommendations(quizzes, max_concurrency=max_concurrency):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            count += 1
+    finally:
+        await close_clients()
+    return count
+
+def main(input_path: str, output_path: str = None, max_concurrency: int = None):
+    quizzes = load_quizzes(input_path)
+    max_concurrency = max_concurrency or DEFAULT_BATCH_CONCURRENCY
+    print(f"Loaded {len(quizzes)} quizzes from {input_path}", file=sys.stderr)
+
+    start = time.perf_counter()
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as output:
+            count = asyncio.run(_run_batch(quizzes, output, max_concurrency))
+    else:
+        count = asyncio.run(_run_batch(quizzes, sys.stdout, max_concurrency))
+    elapsed = time.perf_counter() - start
+
+    print(f"Wrote {count} recommendations in {elapsed:.1f}s "
+          f"({count / elapsed * 60 if elapsed else 0.0:.1f} profiles/minute)", file=sys.stderr)
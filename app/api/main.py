@@ -1,14 +1,28 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional
 import os
+import json
+import time
 import logging
 import traceback
 from dotenv import load_dotenv
 
-from app.api.recommendation_agent import create_pet_recommendation_graph
+from app.api.batch import DEFAULT_BATCH_CONCURRENCY
+from app.api.recommendation_agent import (
+    REQUEST_DEADLINE_SECONDS,
+    abatch_pet_recommendations,
+    arecommend,
+    astream_pet_recommendations,
+    get_pet_recommendation_graph,
+    reset_pet_recommendation_graph,
+)
+from app.utils.clients import warm_up, close_clients
+from app.utils.precomputed import alookup_precomputed
+from app.utils.metrics import record_timing, registry, request_duration, request_timings, time_to_first_content as time_to_first_content_seconds
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -16,7 +30,23 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-app = FastAPI(title="Pet Quiz API")
+BATCH_MAX_QUIZZES = int(os.getenv("BATCH_MAX_QUIZZES", "5000"))
+# Send a Server-Timing breakdown on every response, not only when asked for
+TIMING_HEADER = os.getenv("TIMING_HEADER", "").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the graph and the pooled upstream clients once per process
+    start = time.perf_counter()
+    get_pet_recommendation_graph()
+    warm_up()
+    logger.info(f"Application startup completed in {(time.perf_counter() - start) * 1000:.1f} ms")
+    yield
+    reset_pet_recommendation_graph()
+    await close_clients()
+    logger.info("Application shutdown completed")
+
+app = FastAPI(title="Pet Quiz API", lifespan=lifespan)
 
 # Add exception handler for better error logging
 @app.exception_handler(Exception)
@@ -36,20 +66,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    breakdown = TIMING_HEADER or request.headers.get("x-timing-breakdown") == "1"
+    timings = {} if breakdown else None
+    token = request_timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    elapsed = time.perf_counter() - start
+    # Label by route template so path parameters do not explode cardinality
+    route = request.scope.get("route")
+    request_duration.labels(getattr(route, "path", "unmatched")).observe(elapsed)
+    if breakdown:
+        # Streaming responses only report the time until their headers
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+    return response
+
 class QuizResponse(BaseModel):
     formatted_quiz: str
+    # Optional client deadline; never longer than REQUEST_DEADLINE_SECONDS
+    deadline_ms: Optional[int] = None
+
+class BatchQuizRequest(BaseModel):
+    quizzes: List[str]
+    max_concurrency: Optional[int] = None
 
 class RecommendationResponse(BaseModel):
     summary_es: str
     summary_en: str
     products: List[Dict[str, Any]]
+    # Stages that ran out of budget or failed and were answered with a fallback
+    degraded: List[str] = []
+
+def request_deadline(quiz_data: QuizResponse) -> Optional[float]:
+    if quiz_data.deadline_ms is not None and quiz_data.deadline_ms <= 0:
+        raise HTTPException(status_code=400, detail="deadline_ms must be positive")
+    requested = quiz_data.deadline_ms / 1000 if quiz_data.deadline_ms else None
+    if REQUEST_DEADLINE_SECONDS and requested:
+        return min(requested, REQUEST_DEADLINE_SECONDS)
+    return requested or REQUEST_DEADLINE_SECONDS or None
 
 @app.get("/")
 async def root():
     return {"message": "Pet Quiz API is running"}
 
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/recommend", response_model=RecommendationResponse)
 async def get_recommendations(quiz_data: QuizResponse):
+    deadline = request_deadline(quiz_data)
     try:
         logger.info("Received recommendation request")
 
@@ -59,9 +131,16 @@ async def get_recommendations(quiz_data: QuizResponse):
 
         logger.info(f"Processing quiz data: {quiz_data.formatted_quiz[:100]}...")
 
-        # Create and run the recommendation graph
-        pet_recommendation_graph = create_pet_recommendation_graph()
-        result = pet_recommendation_graph.invoke({"quiz_data": quiz_data.formatted_quiz})
+        # Profiles covered by `run.py precompute` are answered from disk
+        lookup_start = time.perf_counter()
+        precomputed = await alookup_precomputed(quiz_data.formatted_quiz)
+        record_timing("precomputed", time.perf_counter() - lookup_start)
+        if precomputed is not None:
+            logger.info("Serving precomputed recommendations")
+            return RecommendationResponse(**precomputed)
+
+        # Concurrent identical quizzes share one graph execution
+        result = await arecommend(quiz_data.formatted_quiz, deadline)
 
         logger.info(f"Recommendation graph result keys: {result.keys() if result else 'None'}")
 
@@ -70,17 +149,79 @@ async def get_recommendations(quiz_data: QuizResponse):
             return RecommendationResponse(
                 summary_es=result.get("summary_es", "No se pudo generar un resumen"),
                 summary_en=result.get("summary_en", "Could not generate a summary"),
-                products=[]
+                products=[],
+                degraded=result.get("degraded", []),
             )
 
         logger.info(f"Returning {len(result['products'])} products")
         return RecommendationResponse(
             summary_es=result["summary_es"],
             summary_en=result["summary_en"],
-            products=result["products"]
+            products=result["products"],
+            degraded=result.get("degraded", []),
         )
 
     except Exception as e:
         error_msg = f"Error processing recommendation: {str(e)}"
         logger.error(f"{error_msg}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=error_msg)
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/recommend/stream")
+async def stream_recommendations(quiz_data: QuizResponse):
+    logger.info("Received streaming recommendation request")
+
+    if not quiz_data.formatted_quiz:
+        logger.warning("Empty quiz data received")
+        raise HTTPException(status_code=400, detail="Formatted quiz data is required")
+
+    deadline = request_deadline(quiz_data)
+
+    async def event_stream():
+        start = time.perf_counter()
+        time_to_first_content = None
+        try:
+            async for event, data in astream_pet_recommendations(quiz_data.formatted_quiz, deadline):
+                if time_to_first_content is None:
+                    time_to_first_content = time.perf_counter() - start
+                    time_to_first_content_seconds.observe(time_to_first_content)
+                    logger.info(f"Time to first content: {time_to_first_content * 1000:.1f} ms")
+                yield _sse_event(event, data)
+        except Exception as e:
+            logger.error(f"Error streaming recommendation: {str(e)}\n{traceback.format_exc()}")
+            yield _sse_event("error", {"detail": f"Error processing recommendation: {str(e)}"})
+
+        total = time.perf_counter() - start
+        yield _sse_event("done", {
+            "time_to_first_content_ms": round(time_to_first_content * 1000, 1) if time_to_first_content is not None else None,
+            "total_ms": round(total * 1000, 1),
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/api/recommend/batch")
+async def batch_recommendations(batch: BatchQuizRequest):
+    logger.info(f"Received batch recommendation request with {len(batch.quizzes)} quizzes")
+
+    if not batch.quizzes or any(not quiz for quiz in batch.quizzes):
+        raise HTTPException(status_code=400, detail="Every quiz in the batch must be non-empty")
+    if len(batch.quizzes) > BATCH_MAX_QUIZZES:
+        raise HTTPException(status_code=400, detail=f"Batches are limited to {BATCH_MAX_QUIZZES} quizzes")
+
+    max_concurrency = min(batch.max_concurrency or DEFAULT_BATCH_CONCURRENCY, DEFAULT_BATCH_CONCURRENCY * 4)
+
+    async def result_lines():
+        try:
+            async for result in abatch_pet_recommendations(batch.quizzes, max_concurrency=max_concurrency):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Error processing batch: {str(e)}\n{traceback.format_exc()}")
+            yield json.dumps({"error": f"Error processing batch: {str(e)}"}) + "\n"
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+from app.api.recommendation_agent import (
+    EXPLANATION_FALLBACK_ES,
+    EXPLANATION_TEMPLATE_ES,
+    RECOMMENDATION_TOP_K,
+    abatch_pet_recommendations,
+    explanation_cache,
+    explanation_cache_key,
+    summary_cache,
+)
+from app.api.batch import DEFAULT_BATCH_CONCURRENCY
+from app.utils.cache import quiz_cache_key
+from app.utils.clients import close_clients, warm_up
+from app.utils.precomputed import FRESH, PRECOMPUTED_PATH, RecommendationTable
+
+load_dotenv()
+
+QUIZ_SPACE_PATH = os.getenv("QUIZ_SPACE_PATH", "data/quiz_space.json")
+PRECOMPUTE_MAX_PROFILES = int(os.getenv("PRECOMPUTE_MAX_PROFILES", "5000"))
+
+def load_quiz_space(path: str) -> Dict[str, List[str]]:
+    # {"question": ["option", ...], ...} in the order the quiz asks them
+    with open(path, encoding="utf-8") as f:
+        space = json.load(f)
+    if not space or not all(isinstance(options, list) and options for options in space.values()):
+        raise ValueError(f"{path} must map each question to a non-empty list of options")
+    return space
+
+def format_profile(space: Dict[str, List[str]], choices: Tuple[int, ...]) -> str:
+    return "\n".join(f"{question}: {options[choice]}" for (question, options), choice in zip(space.items(), choices))
+
+def enumerate_profiles(space: Dict[str, List[str]], max_profiles: int, seed: int = 7) -> Tuple[List[str], bool]:
+    # Every combination when there are at most max_profiles of them,
+    # otherwise a seeded sample. Returns the quizzes and whether they cover
+    # the whole space.
+    sizes = [len(options) for options in space.values()]
+    total = 1
+    for size in sizes:
+        total *= size
+    complete = total <= max_profiles
+    numbers = range(total) if complete else sorted(random.Random(seed).sample(range(total), max_profiles))
+    quizzes = []
+    for number in numbers:
+        # Profile number -> one option per question, last question fastest
+        choices = []
+        for size in reversed(sizes):
+            number, choice = divmod(number, size)
+            choices.append(choice)
+        quizzes.append(format_profile(space, tuple(reversed(choices))))
+    return quizzes, complete
+
+def is_complete(result: Dict) -> bool:
+    # Fallback answers are fine for one request but must not be pinned
+    if result.get("degraded") or len(result["products"]) < RECOMMENDATION_TOP_K:
+        return False
+    fallbacks = (EXPLANATION_FALLBACK_ES, EXPLANATION_TEMPLATE_ES)
+    return all(product.get("explanation_es") and product.get("explanation_en")
+               and product["explanation_es"] not in fallbacks
+               for product in result["products"])
+
+def seed_caches(table: RecommendationTable, keys) -> int:
+    # Stale profiles keep their summary and every explanation whose product
+    # text did not change, so rebuilding them mostly costs a search
+    seeded = 0
+    for key, quiz, status, dirty_ids, payload in table.entries():
+        if key not in keys:
+            continue
+        summary_cache.set(quiz_cache_key(quiz), (payload["summary_es"], payload["summary_en"]))
+        for product in payload["products"]:
+            if product["id"] not in dirty_ids:
+                explanation_cache.set(explanation_cache_key(payload["summary_es"], product["id"]),
+                                      (product["explanation_es"], product["explanation_en"]))
+                seeded += 1
+    return seeded
+
+async def _run_precompute(table: RecommendationTable, quizzes: List[str], max_concurrency: int) -> Dict[str, int]:
+    warm_up()
+    counts = {"stored": 0, "failed": 0}
+    try:
+        async for result in abatch_pet_recommendations(quizzes, max_concurrency=max_concurrency):
+            if is_complete(result):
+                table.put(quizzes[result["index"]], result)
+                counts["stored"] += 1
+            else:
+                counts["failed"] += 1
+    finally:
+        await close_clients()
+    return counts
+
+def main(space_path: str = None, max_profiles: int = None, max_concurrency: int = None, full: bool = False,
+         dry_run: bool = False, seed: int = 7):
+    space_path = space_path or QUIZ_SPACE_PATH
+    space = load_quiz_space(space_path)
+    quizzes, complete = enumerate_profiles(space, max_profiles or PRECOMPUTE_MAX_PROFILES, seed)
+    print(f"{'Enumerated' if complete else 'Sampled'} {len(quizzes)} profiles from {space_path}", file=sys.stderr)
+
+    table = RecommendationTable(PRECOMPUTED_PATH)
+    # Opening the table creates the file, which a dry run must not do
+    statuses = table.statuses() if os.path.exists(PRECOMPUTED_PATH) else {}
+    if statuses and table.get_meta("top_k") not in (None, str(RECOMMENDATION_TOP_K)):
+        print("Recommendation size changed since the last build, recomputing every profile", file=sys.stderr)
+        full = True
+    wanted = {bytes.fromhex(quiz_cache_key(quiz)): quiz for quiz in quizzes}
+    todo = {key: quiz for key, quiz in wanted.items() if full or statuses.get(key, -1) != FRESH}
+    # Only a full enumeration knows which stored profiles left the quiz
+    dropped = [key for key in statuses if key not in wanted] if complete else []
+    print(f"{len(todo)} profiles to compute ({sum(1 for key in todo if key not in statuses)} new, "
+          f"{sum(1 for key in todo if key in statuses)} stale), {len(wanted) - len(todo)} up to date, "
+          f"{len(dropped)} no longer in the quiz", file=sys.stderr)
+    if dry_run:
+        return
+
+    table.delete(dropped)
+    if not full:
+        print(f"Reusing {seed_caches(table, todo)} stored explanations", file=sys.stderr)
+        summary_cache.flush()
+        explanation_cache.flush()
+
+    start = time.perf_counter()
+    counts = asyncio.run(_run_precompute(table, list(todo.values()), max_concurrency or DEFAULT_BATCH_CONCURRENCY))
+    elapsed = time.perf_counter() - start
+    table.set_meta("top_k", str(RECOMMENDATION_TOP_K))
+    table.set_meta("built_at", str(time.time()))
+    table.checkpoint()
+    print(f"Stored {counts['stored']} profiles in {elapsed:.1f}s, {counts['failed']} degraded and left for "
+          f"the next run; {len(table)} profiles in {PRECOMPUTED_PATH} "
+          f"({os.path.getsize(PRECOMPUTED_PATH) / 1024:.0f} KB)", file=sys.stderr)
@@ -1,22 +1,124 @@
+import os
 import json
+import time
+import asyncio
 import logging
-from typing import Dict, List, Any, TypedDict
-from langchain_openai import ChatOpenAI
+import operator
+import threading
+from typing import Annotated, Dict, List, Any, AsyncIterator, Optional, Tuple, TypedDict
 from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.utils.json import parse_partial_json
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage
-from langgraph.graph import StateGraph, END
-from app.utils.pinecone_utils import search_products
+from langgraph.graph import StateGraph, START, END
+from app.utils.cache import create_cache, normalize_text, quiz_cache_key
+from app.utils.clients import get_chat_model
+from app.utils.singleflight import SingleFlight
+from app.utils.metrics import (
+    degraded_stages, instrument_node, node_errors, record_timing, record_token_usage, register_cache,
+    request_setup_duration,
+)
+from app.utils.resilience import UpstreamPolicy
+from app.retrieval.backends import asearch_products
+from app.retrieval.hybrid_backend import reciprocal_rank_fusion
+from app.retrieval.lexical import BM25Index
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class AgentState(TypedDict):
+# Summaries for repeated quiz profiles, keyed on the normalized quiz answers
+summary_cache = create_cache(
+    "summary",
+    maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", "86400")),
+)
+
+# Explanations keyed on (normalized need, product id)
+explanation_cache = create_cache(
+    "explanation",
+    maxsize=int(os.getenv("EXPLANATION_CACHE_SIZE", "20000")),
+    ttl=float(os.getenv("EXPLANATION_CACHE_TTL", "86400")),
+)
+
+register_cache("summary", summary_cache)
+register_cache("explanation", explanation_cache)
+
+# "linear" runs summarize -> search -> explain; "parallel" searches from the
+# quiz while summarizing and re-ranks the candidates once the summary is in
+GRAPH_MODE = os.getenv("GRAPH_MODE", "linear")
+PARALLEL_CANDIDATES = int(os.getenv("PARALLEL_CANDIDATES", "20"))
+RECOMMENDATION_TOP_K = 5
+
+# The batch path explains up to this many profiles per LLM call, waiting
+# at most the window (seconds) for a group to fill; 1 disables grouping
+EXPLANATION_GROUP_SIZE = int(os.getenv("EXPLANATION_GROUP_SIZE", "4"))
+EXPLANATION_GROUP_WINDOW = float(os.getenv("EXPLANATION_GROUP_WINDOW", "0.05"))
+
+# Overall time allowed for /api/recommend; 0 disables the deadline
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))
+
+def parse_stage_budgets(spec: str) -> Dict[str, float]:
+    budgets = {}
+    for item in spec.split(","):
+        stage, _, share = item.partition("=")
+        if share:
+            budgets[stage.strip()] = float(share)
+    return budgets
+
+# Share of the deadline each stage may use. The last stage also gets
+# whatever earlier stages left unused.
+STAGE_BUDGETS = parse_stage_budgets(
+    os.getenv("STAGE_BUDGETS", "summarize=0.4,search_products=0.2,create_explanation=0.4")
+)
+STAGE_BUDGETS.setdefault("prefetch_products", STAGE_BUDGETS.get("summarize", 0.0) + STAGE_BUDGETS.get("search_products", 0.0))
+
+# LLM calls are retried with jitter; LLM_HEDGE=1 also sends a backup
+# request once a call is slower than the recent p95
+summarize_policy = UpstreamPolicy.from_env("LLM", "openai", "summarize", max_retries=2, base_delay=0.5, max_delay=4.0)
+explanation_policy = UpstreamPolicy.from_env(
+    "LLM", "openai", "create_explanation", max_retries=2, base_delay=0.5, max_delay=4.0
+)
+
+class AgentState(TypedDict, total=False):
     quiz_data: str
     summary_es: str
     summary_en: str
+    candidates: List[Dict[str, Any]]
     products: List[Dict[str, Any]]
+    # Absolute time.monotonic() deadline and the total budget it came from
+    deadline: Optional[float]
+    budget_seconds: Optional[float]
+    # Stages that overran their budget or failed, appended by parallel branches
+    degraded: Annotated[List[str], operator.add]
+
+def stage_timeout(state: AgentState, stage: str) -> Optional[float]:
+    deadline = state.get("deadline")
+    if deadline is None:
+        return None
+    remaining = max(0.0, deadline - time.monotonic())
+    if stage == "create_explanation":
+        return remaining
+    return min(remaining, STAGE_BUDGETS.get(stage, 1.0) * state["budget_seconds"])
+
+def mark_degraded(stage: str) -> Dict[str, List[str]]:
+    degraded_stages.labels(stage).inc()
+    return {"degraded": [stage]}
+
+def is_degraded(state: AgentState, stage: str) -> bool:
+    return stage in state.get("degraded", [])
+
+def initial_state(quiz_data: str, deadline_seconds: Optional[float] = None) -> AgentState:
+    state: AgentState = {"quiz_data": quiz_data}
+    if deadline_seconds:
+        state["deadline"] = time.monotonic() + deadline_seconds
+        state["budget_seconds"] = deadline_seconds
+    return state
+
+SUMMARY_FALLBACK = {
+    "summary_es": "No se pudo generar un resumen debido a un error.",
+    "summary_en": "Could not generate a summary due to an error.",
+}
 
 def create_summarize_node():
     prompt = ChatPromptTemplate.from_template("""
@@ -37,14 +139,27 @@ def create_summarize_node():
         }}
     """)
 
-    model = ChatOpenAI(temperature=0.7, model="gpt-4o-mini")
+    model = get_chat_model()
     chain = prompt | model
 
-    def summarize(state: AgentState) -> AgentState:
+    # Nodes return only the keys they update, so branches of the parallel
+    # graph never write the same key in one step
+    @instrument_node("summarize")
+    async def summarize(state: AgentState) -> AgentState:
         try:
             logger.info(f"Processing quiz data: {state['quiz_data'][:100]}...")
-            result = chain.invoke({"quiz_data": state["quiz_data"]})
-            logger.info(f"LLM response: {result.content}")
+            cache_key = quiz_cache_key(state["quiz_data"])
+            cached = await summary_cache.aget(cache_key)
+            if cached is not None:
+                logger.info("Summary cache hit")
+                return {"summary_es": cached[0], "summary_en": cached[1]}
+
+            result = await asyncio.wait_for(
+                summarize_policy.acall(lambda: chain.ainvoke({"quiz_data": state["quiz_data"]})),
+                stage_timeout(state, "summarize"),
+            )
+            record_token_usage("summarize", result)
+            logger.debug(f"LLM response: {result.content}")
 
             # Clean the response to ensure it's valid JSON
             content = result.content.strip()
@@ -56,141 +171,581 @@ def create_summarize_node():
             content = content.strip()
 
             parsed_result = json.loads(content)
-            logger.info(f"Parsed result: {parsed_result}")
-
-            state["summary_es"] = parsed_result["summary_es"]
-            state["summary_en"] = parsed_result["summary_en"]
-            return state
+            logger.debug(f"Parsed result: {parsed_result}")
+
+            summary = {"summary_es": parsed_result["summary_es"], "summary_en": parsed_result["summary_en"]}
+            summary_cache.set(cache_key, (summary["summary_es"], summary["summary_en"]))
+            return summary
+        except asyncio.TimeoutError:
+            logger.warning("Summarize overran its budget, searching with the raw quiz")
+            return {**SUMMARY_FALLBACK, **mark_degraded("summarize")}
         except Exception as e:
             logger.error(f"Error in summarize node: {str(e)}")
-            # Provide default values instead of failing
-            state["summary_es"] = "No se pudo generar un resumen debido a un error."
-            state["summary_en"] = "Could not generate a summary due to an error."
-            return state
+            node_errors.labels("summarize").inc()
+            # Provide default values instead of failing; later stages work
+            # from the quiz itself
+            return {**SUMMARY_FALLBACK, **mark_degraded("summarize")}
 
     return summarize
 
 def create_search_products_node():
-    def search_for_products(state: AgentState) -> AgentState:
+    @instrument_node("search_products")
+    async def search_for_products(state: AgentState) -> AgentState:
         try:
-            query = state["summary_es"]
+            if is_degraded(state, "summarize"):
+                query = quiz_search_query(state["quiz_data"])
+            else:
+                query = state["summary_es"]
             logger.info(f"Searching products with query: {query}")
-            search_results = search_products(query)
+            search_results = await asyncio.wait_for(asearch_products(query), stage_timeout(state, "search_products"))
             logger.info(f"Found {len(search_results)} products")
-            state["products"] = search_results
-            return state
+            return {"products": search_results}
+        except asyncio.TimeoutError:
+            logger.warning("Search overran its budget, returning no products")
+            return {"products": [], **mark_degraded("search_products")}
         except Exception as e:
             logger.error(f"Error in search_products node: {str(e)}")
-            state["products"] = []
-            return state
+            node_errors.labels("search_products").inc()
+            return {"products": [], **mark_degraded("search_products")}
 
     return search_for_products
 
-def create_explanation_node():
-    model = ChatOpenAI(temperature=0.7, model="gpt-4o-mini")
-
-    def create_explanation(state: AgentState) -> AgentState:
+def quiz_search_query(quiz_data: str) -> str:
+    # Keep the answers of "question: answer" lines; the questions repeat
+    # across every quiz and would dominate the query
+    answers = []
+    for line in quiz_data.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if "?" in line:
+            line = line.rsplit("?", 1)[1]
+        elif ":" in line:
+            line = line.split(":", 1)[1]
+        line = line.strip(" :-")
+        if line:
+            answers.append(line)
+    return ". ".join(answers) or quiz_data.strip()
+
+def create_prefetch_products_node():
+    @instrument_node("prefetch_products")
+    async def prefetch_products(state: AgentState) -> AgentState:
+        try:
+            query = quiz_search_query(state["quiz_data"])
+            logger.info(f"Prefetching candidates with quiz query: {query}")
+            candidates = await asyncio.wait_for(
+                asearch_products(query, top_k=PARALLEL_CANDIDATES), stage_timeout(state, "prefetch_products")
+            )
+            logger.info(f"Prefetched {len(candidates)} candidates")
+            return {"candidates": candidates}
+        except asyncio.TimeoutError:
+            logger.warning("Prefetch overran its budget, returning no products")
+            return {"candidates": [], **mark_degraded("search_products")}
+        except Exception as e:
+            logger.error(f"Error in prefetch_products node: {str(e)}")
+            node_errors.labels("prefetch_products").inc()
+            return {"candidates": [], **mark_degraded("search_products")}
+
+    return prefetch_products
+
+def rerank_candidates(candidates: List[Dict[str, Any]], summary_es: str, summary_en: str,
+                      top_k: int = RECOMMENDATION_TOP_K) -> List[Dict[str, Any]]:
+    # Fuse the quiz-query ranking with a BM25 ranking of the same candidates
+    # against the summary, so the LLM's reading of the need reorders them
+    # without a second search round trip
+    if len(candidates) <= 1:
+        return candidates[:top_k]
+    index = BM25Index(f"{c.get('name', '')} {c.get('description', '')}" for c in candidates)
+    scores = index.scores(f"{summary_es} {summary_en}")
+    retrieval_ranking = list(range(len(candidates)))
+    summary_ranking = [i for i in sorted(retrieval_ranking, key=lambda i: -scores[i]) if scores[i] > 0]
+    fused = reciprocal_rank_fusion([retrieval_ranking, summary_ranking], [1.0, 1.0])
+    ranked = sorted(fused, key=lambda i: -fused[i])[:top_k]
+    return [dict(candidates[i], score=fused[i]) for i in ranked]
+
+def create_rerank_products_node():
+    @instrument_node("rerank_products")
+    async def rerank_products(state: AgentState) -> AgentState:
+        try:
+            if is_degraded(state, "summarize"):
+                # Without a summary the quiz-query order is the best we have
+                return {"products": state.get("candidates", [])[:RECOMMENDATION_TOP_K]}
+            products = rerank_candidates(state.get("candidates", []), state["summary_es"], state["summary_en"])
+            logger.info(f"Re-ranked {len(state.get('candidates', []))} candidates to {len(products)} products")
+            return {"products": products}
+        except Exception as e:
+            logger.error(f"Error in rerank_products node: {str(e)}")
+            node_errors.labels("rerank_products").inc()
+            return {"products": state.get("candidates", [])[:RECOMMENDATION_TOP_K]}
+
+    return rerank_products
+
+EXPLANATION_FALLBACK_ES = "No se pudo generar una explicación para este producto."
+EXPLANATION_FALLBACK_EN = "Could not generate an explanation for this product."
+# Used when explanations overrun the deadline
+EXPLANATION_TEMPLATE_ES = "Lo elegimos porque coincide con tus respuestas del quiz."
+EXPLANATION_TEMPLATE_EN = "Picked because it matches your quiz answers."
+
+def explanation_cache_key(summary_es: str, product_id: str):
+    return (normalize_text(summary_es), product_id)
+
+def build_explanation_messages(summary_es: str, summary_en: str, products: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    # Prepare simplified product data for the prompt
+    products_for_prompt = []
+    for product in products:
+        products_for_prompt.append({
+            "id": product["id"],
+            "name": product["name"],
+            "description": product["description"][:200]
+        })
+
+    # Create the prompt directly as a message
+    system_message = """Actúa como un experto en mascotas bilingüe (español e inglés). Genera explicaciones breves de por qué cada producto satisface las necesidades específicas del usuario en ambos idiomas.
+
+        Instrucciones:
+        1. Para cada producto en la lista, crea una explicación corta y concisa (máximo 2 frases) en español e inglés.
+        2. Enfócate en por qué el producto es adecuado para las necesidades específicas de la mascota.
+        3. Menciona solo las características más relevantes que se alinean con las necesidades.
+        4. Responde con un JSON que contenga el ID del producto y sus explicaciones en ambos idiomas.
+    """
+
+    # Define the JSON format template separately to avoid f-string escaping issues
+    json_format = '[{"id": "id_del_producto", "explanation_es": "explicación_concisa_español", "explanation_en": "concise_explanation_english"}]'
+
+    user_message = f"""Necesidades del usuario (español):
+        {summary_es}
+
+        Necesidades del usuario (inglés):
+        {summary_en}
+
+        Productos:
+        {json.dumps(products_for_prompt, ensure_ascii=False)}
+
+        Genera una explicación concisa para cada producto en español e inglés y devuelve un JSON con este formato:
+        {json_format}
+    """
+
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message}
+    ]
+
+def build_grouped_explanation_messages(groups: List[Tuple[str, str, List[Dict[str, Any]]]]) -> List[Dict[str, str]]:
+    # One prompt for several profiles, each with its own need and products
+    profiles = [
+        {
+            "perfil": number,
+            "necesidades_es": need_es,
+            "necesidades_en": need_en,
+            "productos": [
+                {"id": product["id"], "name": product["name"], "description": product["description"][:200]}
+                for product in products
+            ],
+        }
+        for number, (need_es, need_en, products) in enumerate(groups)
+    ]
+
+    system_message = """Actúa como un experto en mascotas bilingüe (español e inglés). Recibirás varios perfiles de usuario, cada uno con sus necesidades y sus productos. Genera explicaciones breves de por qué cada producto satisface las necesidades de su perfil en ambos idiomas.
+
+        Instrucciones:
+        1. Para cada producto de cada perfil, crea una explicación corta y concisa (máximo 2 frases) en español e inglés.
+        2. Usa solo las necesidades del perfil al que pertenece el producto.
+        3. Menciona solo las características más relevantes que se alinean con las necesidades.
+        4. Responde con un único JSON que contenga el número de perfil, el ID del producto y sus explicaciones en ambos idiomas.
+    """
+
+    json_format = '[{"perfil": 0, "id": "id_del_producto", "explanation_es": "explicación_concisa_español", "explanation_en": "concise_explanation_english"}]'
+
+    user_message = f"""Perfiles:
+        {json.dumps(profiles, ensure_ascii=False)}
+
+        Genera una explicación concisa para cada producto de cada perfil en español e inglés y devuelve un JSON con este formato:
+        {json_format}
+    """
+
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message}
+    ]
+
+def parse_explanations(content: str, groups: List[List[Dict[str, Any]]]) -> List[Dict[str, Tuple[str, str]]]:
+    # Explanations per group of products. Items without a profile number
+    # belong to the first group, as in the single-profile prompt.
+    explanations = [{} for _ in groups]
+    try:
+        # Extract JSON from potential markdown code blocks
+        parsed_content = JsonOutputParser().parse(content)
+        product_ids = [{product["id"] for product in products} for products in groups]
+        for item in parsed_content:
+            number = item.get("perfil", 0)
+            if not isinstance(number, int) or not 0 <= number < len(groups) or item.get("id") not in product_ids[number]:
+                continue
+            explanations[number][item["id"]] = (item["explanation_es"], item["explanation_en"])
+    except Exception as e:
+        # Products without a parsed explanation get the fallback text
+        logger.error(f"Failed to parse model response: {str(e)}\nResponse content: {content}")
+        node_errors.labels("create_explanation").inc()
+    return explanations
+
+async def generate_explanations(model, need_es: str, need_en: str,
+                                products: List[Dict[str, Any]]) -> Dict[str, Tuple[str, str]]:
+    logger.info(f"Generating explanations for {len(products)} products in a single call")
+    messages = build_explanation_messages(need_es, need_en, products)
+    result = await explanation_policy.acall(lambda: model.ainvoke(messages))
+    record_token_usage("create_explanation", result)
+    return parse_explanations(result.content, [products])[0]
+
+class ExplanationGrouper:
+    """Answers the explanation requests of concurrent profiles in shared calls.
+
+    Requests are queued until max_profiles are waiting or the first one has
+    waited window seconds, then sent as one grouped prompt. Used by the batch
+    path, where many profiles reach the explanation stage together.
+    """
+
+    def __init__(self, model, max_profiles: int, window: float, limit: Optional[asyncio.Semaphore] = None):
+        self.model = model
+        self.max_profiles = max_profiles
+        self.window = window
+        self.limit = limit
+        self._pending: List[Tuple[str, str, List[Dict[str, Any]], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def explain(self, need_es: str, need_en: str, products: List[Dict[str, Any]]) -> Dict[str, Tuple[str, str]]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((need_es, need_en, products, future))
+        if len(self._pending) >= self.max_profiles:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        group, self._pending = self._pending, []
+        if group:
+            task = asyncio.create_task(self._run(group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group):
+        try:
+            if self.limit is not None:
+                async with self.limit:
+                    explanations = await self._call(group)
+            else:
+                explanations = await self._call(group)
+        except asyncio.CancelledError:
+            for *_, future in group:
+                future.cancel()
+            raise
+        except Exception as e:
+            for *_, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (*_, future), result in zip(group, explanations):
+            # A caller that overran its stage budget has given up on its result
+            if not future.done():
+                future.set_result(result)
+
+    async def _call(self, group) -> List[Dict[str, Tuple[str, str]]]:
+        if len(group) == 1:
+            need_es, need_en, products, _ = group[0]
+            return [await generate_explanations(self.model, need_es, need_en, products)]
+        logger.info(f"Generating explanations for {len(group)} profiles "
+                    f"({sum(len(products) for _, _, products, _ in group)} products) in a single call")
+        messages = build_grouped_explanation_messages([(need_es, need_en, products) for need_es, need_en, products, _ in group])
+        result = await explanation_policy.acall(lambda: self.model.ainvoke(messages))
+        record_token_usage("create_explanation", result)
+        return parse_explanations(result.content, [products for _, _, products, _ in group])
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in list(self._tasks):
+            task.cancel()
+
+def merge_explanations(products: List[Dict[str, Any]], explanations: Dict[str, tuple],
+                       fallback: Tuple[str, str] = (EXPLANATION_FALLBACK_ES, EXPLANATION_FALLBACK_EN)) -> List[Dict[str, Any]]:
+    # Add explanations to products in their original order and remove descriptions
+    products_with_explanations = []
+    for product in products:
+        product_copy = {k: v for k, v in product.items() if k != "description"}
+        explanation_es, explanation_en = explanations.get(product["id"], fallback)
+        product_copy["explanation_es"] = explanation_es
+        product_copy["explanation_en"] = explanation_en
+        products_with_explanations.append(product_copy)
+    return products_with_explanations
+
+def create_explanation_node(explain=None):
+    # explain(need_es, need_en, products) returns {product id: (es, en)} for
+    # the products it could explain; defaults to one LLM call per profile
+    if explain is None:
+        model = get_chat_model()
+
+        async def explain(need_es, need_en, products):
+            return await generate_explanations(model, need_es, need_en, products)
+
+    @instrument_node("create_explanation")
+    async def create_explanation(state: AgentState) -> AgentState:
         try:
             if not state["products"]:
                 logger.info("No products found, skipping explanations")
-                return state
-
-            logger.info(f"Generating explanations for {len(state['products'])} products in a single call")
-
-            # Prepare simplified product data for the prompt
-            products_for_prompt = []
-            for product in state["products"]:
-                products_for_prompt.append({
-                    "id": product["id"],
-                    "name": product["name"],
-                    "description": product["description"][:200]
-                })
-
-            # Create the prompt directly as a message
-            system_message = """Actúa como un experto en mascotas bilingüe (español e inglés). Genera explicaciones breves de por qué cada producto satisface las necesidades específicas del usuario en ambos idiomas.
-
-                Instrucciones:
-                1. Para cada producto en la lista, crea una explicación corta y concisa (máximo 2 frases) en español e inglés.
-                2. Enfócate en por qué el producto es adecuado para las necesidades específicas de la mascota.
-                3. Menciona solo las características más relevantes que se alinean con las necesidades.
-                4. Responde con un JSON que contenga el ID del producto y sus explicaciones en ambos idiomas.
-            """
-
-            # Define the JSON format template separately to avoid f-string escaping issues
-            json_format = '[{"id": "id_del_producto", "explanation_es": "explicación_concisa_español", "explanation_en": "concise_explanation_english"}]'
-
-            user_message = f"""Necesidades del usuario (español):
-                {state['summary_es']}
-
-                Necesidades del usuario (inglés):
-                {state['summary_en']}
-
-                Productos:
-                {json.dumps(products_for_prompt, ensure_ascii=False)}
-
-                Genera una explicación concisa para cada producto en español e inglés y devuelve un JSON con este formato:
-                {json_format}
-            """
-
-            # Make a single call to the model with all products
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ]
-            result = model.invoke(messages)
-
-            # Parse the response using LangChain's JSON parser
-            try:
-                # Extract JSON from potential markdown code blocks
-                parser = JsonOutputParser()
-                parsed_content = parser.parse(result.content)
-
-                # Create dictionaries for quick lookup
-                explanation_es_dict = {item["id"]: item["explanation_es"] for item in parsed_content}
-                explanation_en_dict = {item["id"]: item["explanation_en"] for item in parsed_content}
-
-                # Add explanations to products and remove descriptions
-                products_with_explanations = []
-                for product in state["products"]:
-                    product_copy = {k: v for k, v in product.items() if k != "description"}
-                    product_copy["explanation_es"] = explanation_es_dict.get(
-                        product["id"], "No se pudo generar una explicación para este producto."
+                return {"products": []}
+
+            # Without a summary the quiz answers stand in for the need
+            if is_degraded(state, "summarize"):
+                need_es = need_en = state["quiz_data"]
+            else:
+                need_es, need_en = state["summary_es"], state["summary_en"]
+
+            # Reuse explanations already generated for this need and product
+            explanations = {}
+            missing = []
+            cached_explanations = await explanation_cache.aget_many(
+                [explanation_cache_key(need_es, product["id"]) for product in state["products"]]
+            )
+            for product, cached in zip(state["products"], cached_explanations):
+                if cached is not None:
+                    explanations[product["id"]] = cached
+                else:
+                    missing.append(product)
+
+            logger.info(f"Explanation cache: {len(explanations)} hits, {len(missing)} misses")
+
+            if missing:
+                try:
+                    generated = await asyncio.wait_for(
+                        explain(need_es, need_en, missing), stage_timeout(state, "create_explanation")
                     )
-                    product_copy["explanation_en"] = explanation_en_dict.get(
-                        product["id"], "Could not generate an explanation for this product."
+                except asyncio.TimeoutError:
+                    logger.warning("Explanations overran their budget, using templated text")
+                    products = merge_explanations(
+                        state["products"], explanations, (EXPLANATION_TEMPLATE_ES, EXPLANATION_TEMPLATE_EN)
                     )
-                    products_with_explanations.append(product_copy)
-
-                state["products"] = products_with_explanations
-            except Exception as e:
-                logger.error(f"Failed to parse model response: {str(e)}\nResponse content: {result.content}")
-                # Fallback: keep products without descriptions removed
-                products_with_explanations = []
-                for product in state["products"]:
-                    product_copy = {k: v for k, v in product.items() if k != "description"}
-                    product_copy["explanation_es"] = "No se pudo generar una explicación para este producto."
-                    product_copy["explanation_en"] = "Could not generate an explanation for this product."
-                    products_with_explanations.append(product_copy)
-                state["products"] = products_with_explanations
-
-            return state
+                    return {"products": products, **mark_degraded("create_explanation")}
+                for product_id, explanation in generated.items():
+                    explanations[product_id] = explanation
+                    explanation_cache.set(explanation_cache_key(need_es, product_id), explanation)
+
+            return {"products": merge_explanations(state["products"], explanations)}
         except Exception as e:
             logger.error(f"Error in create_explanation node: {str(e)}")
+            node_errors.labels("create_explanation").inc()
             # Return products without explanations rather than failing
-            return state
+            return {"products": state["products"], **mark_degraded("create_explanation")}
 
     return create_explanation
 
-def create_pet_recommendation_graph():
+def create_pet_recommendation_graph(mode: Optional[str] = None):
+    mode = mode or GRAPH_MODE
     workflow = StateGraph(AgentState)
 
     workflow.add_node("summarize", create_summarize_node())
-    workflow.add_node("search_products", create_search_products_node())
     workflow.add_node("create_explanation", create_explanation_node())
 
-    workflow.set_entry_point("summarize")
-    workflow.add_edge("summarize", "search_products")
-    workflow.add_edge("search_products", "create_explanation")
+    if mode == "parallel":
+        # Search from the quiz answers while the summary is generated, then
+        # re-rank; explanations wait for both branches
+        workflow.add_node("prefetch_products", create_prefetch_products_node())
+        workflow.add_node("rerank_products", create_rerank_products_node())
+        workflow.add_edge(START, "summarize")
+        workflow.add_edge(START, "prefetch_products")
+        workflow.add_edge(["summarize", "prefetch_products"], "rerank_products")
+        workflow.add_edge("rerank_products", "create_explanation")
+    elif mode == "linear":
+        workflow.add_node("search_products", create_search_products_node())
+        workflow.set_entry_point("summarize")
+        workflow.add_edge("summarize", "search_products")
+        workflow.add_edge("search_products", "create_explanation")
+    else:
+        raise ValueError(f"Unknown graph mode: {mode}")
     workflow.add_edge("create_explanation", END)
 
     return workflow.compile()
+
+
+_compiled_graph = None
+_graph_lock = threading.Lock()
+
+def get_pet_recommendation_graph():
+    # The compiled graph is stateless between invocations, so it is built once
+    # per process and shared by every request.
+    global _compiled_graph
+    if _compiled_graph is None:
+        with _graph_lock:
+            if _compiled_graph is None:
+                _compiled_graph = create_pet_recommendation_graph()
+    return _compiled_graph
+
+# Identical quizzes submitted at the same time run the graph once
+recommendation_flight = SingleFlight("recommend")
+
+def record_setup(start: float):
+    elapsed = time.perf_counter() - start
+    request_setup_duration.observe(elapsed)
+    record_timing("setup", elapsed)
+
+async def arecommend(quiz_data: str, deadline_seconds: Optional[float] = None) -> Dict[str, Any]:
+    # Callers share the returned state, so treat it as read-only. A request
+    # only joins an identical in-flight one that has at least its budget.
+    start = time.perf_counter()
+    graph = get_pet_recommendation_graph()
+    key = quiz_cache_key(quiz_data)
+    state = initial_state(quiz_data, deadline_seconds)
+    record_setup(start)
+    return await recommendation_flight.do(key, lambda: graph.ainvoke(state), budget=deadline_seconds)
+
+def reset_pet_recommendation_graph():
+    global _compiled_graph
+    with _graph_lock:
+        _compiled_graph = None
+
+def _completed_explanations(buffer: str) -> List[Dict[str, Any]]:
+    # Parse the partial JSON array streamed so far. Every item except the last
+    # is complete; the last one may still be receiving tokens.
+    start = buffer.find("[")
+    if start == -1:
+        return []
+    try:
+        items = parse_partial_json(buffer[start:])
+    except Exception:
+        return []
+    if not isinstance(items, list):
+        return []
+    return [
+        item for item in items[:-1]
+        if isinstance(item, dict) and "id" in item and "explanation_es" in item and "explanation_en" in item
+    ]
+
+async def astream_pet_recommendations(quiz_data: str, deadline_seconds: Optional[float] = None
+                                      ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    # Run the shared graph and yield (event, payload) pairs as each stage
+    # completes, including explanations parsed from the streamed LLM tokens.
+    start = time.perf_counter()
+    graph = get_pet_recommendation_graph()
+    state = initial_state(quiz_data, deadline_seconds)
+    record_setup(start)
+    product_ids = set()
+    emitted = set()
+    # Hedged or retried explanation calls stream separately; keep one
+    # buffer per LLM message
+    buffers: Dict[str, str] = {}
+
+    async for mode, chunk in graph.astream(state, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") != "create_explanation" or not isinstance(message.content, str):
+                continue
+            buffers[message.id] = buffers.get(message.id, "") + message.content
+            for item in _completed_explanations(buffers[message.id]):
+                if item["id"] in product_ids and item["id"] not in emitted:
+                    emitted.add(item["id"])
+                    yield "explanation", {
+                        "id": item["id"],
+                        "explanation_es": item["explanation_es"],
+                        "explanation_en": item["explanation_en"],
+                    }
+            continue
+
+        for node, update in chunk.items():
+            if not update:
+                continue
+            if update.get("degraded"):
+                yield "degraded", {"stages": update["degraded"]}
+            if node == "summarize":
+                yield "summary", {"summary_es": update["summary_es"], "summary_en": update["summary_en"]}
+            elif node in ("search_products", "rerank_products"):
+                products = update.get("products", [])
+                product_ids = {product["id"] for product in products}
+                yield "products", {
+                    "products": [{k: v for k, v in product.items() if k != "description"} for product in products]
+                }
+            elif node == "create_explanation":
+                # Cached, fallback and not-yet-emitted explanations
+                for product in update.get("products", []):
+                    if product["id"] in emitted or "explanation_es" not in product:
+                        continue
+                    emitted.add(product["id"])
+                    yield "explanation", {
+                        "id": product["id"],
+                        "explanation_es": product["explanation_es"],
+                        "explanation_en": product["explanation_en"],
+                    }
+
+async def abatch_pet_recommendations(quizzes: List[str], max_concurrency: int = 8) -> AsyncIterator[Dict[str, Any]]:
+    # Recommend for many quizzes at once, yielding one result per input as
+    # soon as its profile is done. Duplicate quizzes share one execution, and
+    # profiles reaching the explanation stage together share grouped LLM
+    # calls. Distinct profiles only share a search in the rare case their
+    # summaries normalize to the same text.
+    semaphore = asyncio.Semaphore(max_concurrency)
+    summarize = create_summarize_node()
+    search = create_search_products_node()
+    grouper = None
+    if EXPLANATION_GROUP_SIZE > 1:
+        grouper = ExplanationGrouper(get_chat_model(), EXPLANATION_GROUP_SIZE, EXPLANATION_GROUP_WINDOW, semaphore)
+        explain = create_explanation_node(grouper.explain)
+    else:
+        explain = create_explanation_node()
+
+    profiles: Dict[str, List[int]] = {}
+    unique_quizzes: Dict[str, str] = {}
+    for index, quiz in enumerate(quizzes):
+        key = quiz_cache_key(quiz)
+        profiles.setdefault(key, []).append(index)
+        unique_quizzes.setdefault(key, quiz)
+    logger.info(f"Batch of {len(quizzes)} quizzes has {len(unique_quizzes)} unique profiles")
+
+    need_tasks: Dict[str, asyncio.Task] = {}
+
+    async def run_need(summary: AgentState) -> Tuple[List[Dict[str, Any]], List[str]]:
+        # The nodes search and explain with the raw quiz when summarize degraded
+        state = dict(summary)
+        degraded = []
+        for node in (search, explain):
+            # A grouped explanation takes a slot once per call, not per profile
+            if node is explain and grouper is not None:
+                update = await node(state)
+            else:
+                async with semaphore:
+                    update = await node(state)
+            added = update.get("degraded", [])
+            degraded += added
+            state.update(update, degraded=state.get("degraded", []) + added)
+        return state["products"], degraded
+
+    async def run_profile(key: str) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]], List[str]]:
+        async with semaphore:
+            state = await summarize({"quiz_data": unique_quizzes[key]})
+        state["quiz_data"] = unique_quizzes[key]
+        # A fallback summary says nothing about the need, so such a profile
+        # only shares work with identical quizzes
+        need = key if is_degraded(state, "summarize") else normalize_text(state["summary_es"])
+        if need not in need_tasks:
+            need_tasks[need] = asyncio.create_task(run_need(state))
+        products, degraded = await need_tasks[need]
+        return key, state, products, state.get("degraded", []) + degraded
+
+    tasks = [asyncio.create_task(run_profile(key)) for key in unique_quizzes]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            key, state, products, degraded = await next_done
+            for index in profiles[key]:
+                yield {
+                    "index": index,
+                    "summary_es": state["summary_es"],
+                    "summary_en": state["summary_en"],
+                    "products": products,
+                    "degraded": degraded,
+                }
+    finally:
+        for task in list(tasks) + list(need_tasks.values()):
+            task.cancel()
+        if grouper is not None:
+            grouper.close()
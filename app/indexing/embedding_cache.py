@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.blake2b(f"{model}\0{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+class EmbeddingCache:
+    """Append-only on-disk cache of embeddings for one model.
+
+    Vectors live in ``<model>.f32`` as a raw float32 matrix that is opened with
+    ``np.memmap``, so cached rows are read straight from the page cache
+    without copying. ``<model>.keys`` lists one key per row in the same order
+    and is loaded into a dict at startup.
+    """
+
+    def __init__(self, directory: str, model: str):
+        self.directory = directory
+        self.model = model
+        safe_name = model.replace("/", "_")
+        self.vectors_path = os.path.join(directory, f"{safe_name}.f32")
+        self.keys_path = os.path.join(directory, f"{safe_name}.keys")
+        self.meta_path = os.path.join(directory, f"{safe_name}.json")
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self.dimension: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, encoding="utf-8") as f:
+            self.dimension = json.load(f)["dimension"]
+        keys = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, encoding="utf-8") as f:
+                keys = f.read().split()
+        rows = os.path.getsize(self.vectors_path) // (4 * self.dimension) if os.path.exists(self.vectors_path) else 0
+        if rows != len(keys):
+            # An interrupted append left the files out of step; keep the rows
+            # both files agree on so later appends stay aligned
+            keys = keys[:rows]
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(len(keys) * 4 * self.dimension)
+            with open(self.keys_path, "w", encoding="utf-8") as f:
+                f.write("".join(f"{key}\n" for key in keys))
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._open_matrix(len(keys))
+
+    def _open_matrix(self, rows: int):
+        self._matrix = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+            if rows else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, texts: Sequence[str]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        # Returns one vector (a memmap row view) or None per text, plus the
+        # positions of the misses
+        with self._lock:
+            vectors: List[Optional[np.ndarray]] = []
+            missing = []
+            for position, text in enumerate(texts):
+                row = self._rows.get(embedding_key(self.model, text))
+                if row is None:
+                    vectors.append(None)
+                    missing.append(position)
+                else:
+                    vectors.append(self._matrix[row])
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            return vectors, missing
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = int(matrix.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model, "dimension": self.dimension}, f)
+            elif matrix.shape[1] != self.dimension:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match cache dimension {self.dimension}")
+
+            new_keys = {}
+            for text, vector in zip(texts, matrix):
+                key = embedding_key(self.model, text)
+                if key not in self._rows and key not in new_keys:
+                    new_keys[key] = vector
+            new_rows = list(new_keys.values())
+            if not new_keys:
+                return
+
+            # Vectors first, then keys; _load realigns the files after a crash
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.asarray(new_rows, dtype=np.float32).tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{key}\n" for key in new_keys))
+
+            start = len(self._rows)
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = start + offset
+            self._open_matrix(len(self._rows))
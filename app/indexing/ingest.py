@@ -0,0 +1,61 @@
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+import pandas as pd
+
+CATALOG_COLUMNS = ["id", "name", "image_url", "price", "product_link", "description_keywords", "search_query"]
+_STRING_COLUMNS = {column: str for column in CATALOG_COLUMNS if column != "price"}
+
+# Generator pipeline: read_chunks -> valid_rows -> build_records -> batched.
+# Each stage holds at most one chunk, so memory stays bounded by chunksize.
+
+def read_chunks(paths: Sequence[str], chunksize: int = 2000) -> Iterator[pd.DataFrame]:
+    for path in paths:
+        reader = pd.read_csv(path, usecols=CATALOG_COLUMNS, dtype=_STRING_COLUMNS, chunksize=chunksize)
+        with reader:
+            for chunk in reader:
+                yield chunk
+
+def valid_rows(chunks: Iterable[pd.DataFrame], stats: Dict[str, int]) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        stats["rows"] = stats.get("rows", 0) + len(chunk)
+        description = chunk["description_keywords"]
+        mask = description.notna() & description.str.strip().ne("") & chunk["id"].notna()
+        skipped = len(chunk) - int(mask.sum())
+        if skipped:
+            stats["skipped"] = stats.get("skipped", 0) + skipped
+            print(f"Skipping {skipped} products with empty id or description")
+        yield chunk[mask]
+
+def build_records(chunks: Iterable[pd.DataFrame]) -> Iterator[Dict[str, Any]]:
+    for chunk in chunks:
+        # Column-wise conversion and zip avoid building a Series per row
+        columns = zip(
+            chunk["id"].tolist(),
+            chunk["description_keywords"].tolist(),
+            chunk["name"].fillna("").tolist(),
+            chunk["price"].fillna(0.0).astype(float).tolist(),
+            chunk["image_url"].fillna("").tolist(),
+            chunk["product_link"].fillna("").tolist(),
+            chunk["search_query"].fillna("").tolist(),
+        )
+        for product_id, text, name, price, image_url, product_link, search_query in columns:
+            yield {
+                "_id": product_id,
+                "text": text,  # Field that will be embedded
+                "name": name,
+                "price": price,
+                "image_url": image_url,
+                "product_link": product_link,
+                "search_query": search_query,
+            }
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def iter_catalog_records(paths: Sequence[str], stats: Dict[str, int], chunksize: int = 2000) -> Iterator[Dict[str, Any]]:
+    return build_records(valid_rows(read_chunks(paths, chunksize), stats))
@@ -0,0 +1,103 @@
+import os
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Set
+
+def _hash(value: Any) -> str:
+    # 128-bit digests keep the manifest small for million-row catalogs
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+def text_hash(record: Dict[str, Any]) -> str:
+    return _hash(record["text"])
+
+def metadata_hash(record: Dict[str, Any]) -> str:
+    return _hash({k: v for k, v in record.items() if k not in ("_id", "text")})
+
+NEW = "new"
+TEXT_CHANGED = "text changed"
+METADATA_CHANGED = "metadata changed"
+UNCHANGED = "unchanged"
+
+@dataclass
+class ManifestDiff:
+    counts: Dict[str, int] = field(default_factory=lambda: {NEW: 0, TEXT_CHANGED: 0, METADATA_CHANGED: 0, UNCHANGED: 0})
+    removed: List[str] = field(default_factory=list)
+    # Ids per status, for everything but unchanged products
+    ids: Dict[str, List[str]] = field(default_factory=lambda: {NEW: [], TEXT_CHANGED: [], METADATA_CHANGED: []})
+
+    def add(self, status: str, product_id: str = None):
+        self.counts[status] += 1
+        if product_id is not None and status in self.ids:
+            self.ids[status].append(product_id)
+
+    def summary(self) -> str:
+        return (f"{self.counts[NEW]} new, {self.counts[TEXT_CHANGED]} text changed, "
+                f"{self.counts[METADATA_CHANGED]} metadata-only changed, {len(self.removed)} removed, "
+                f"{self.counts[UNCHANGED]} unchanged")
+
+class IndexManifest:
+    """Per-product content hashes of what was last written to the index.
+
+    Text and metadata are hashed separately so a price or link change can be
+    applied with a metadata update instead of a new embedding.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: str, index_name: str, namespace: str, embedding_model: str):
+        self.path = path
+        self.index_name = index_name
+        self.namespace = namespace
+        self.embedding_model = embedding_model
+        self.products: Dict[str, Dict[str, str]] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        # A different index, namespace or model invalidates every stored hash
+        if (data.get("version") == self.VERSION
+                and data.get("index") == self.index_name
+                and data.get("namespace") == self.namespace
+                and data.get("embedding_model") == self.embedding_model):
+            self.products = data.get("products", {})
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": self.VERSION,
+                "index": self.index_name,
+                "namespace": self.namespace,
+                "embedding_model": self.embedding_model,
+                "products": self.products,
+            }, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def classify(self, record: Dict[str, Any]) -> str:
+        entry = self.products.get(record["_id"])
+        if entry is None:
+            return NEW
+        if entry["text"] != text_hash(record):
+            return TEXT_CHANGED
+        if entry["metadata"] != metadata_hash(record):
+            return METADATA_CHANGED
+        return UNCHANGED
+
+    def removed_ids(self, seen_ids: Set[str]) -> List[str]:
+        return sorted(set(self.products) - seen_ids)
+
+    def record(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            self.products[record["_id"]] = {"text": text_hash(record), "metadata": metadata_hash(record)}
+
+    def forget(self, product_ids: Iterable[str]):
+        for product_id in product_ids:
+            self.products.pop(product_id, None)
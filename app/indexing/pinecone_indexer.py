@@ -1,18 +1,59 @@
 import os
 import time
-import pandas as pd
+import threading
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 from pinecone import Pinecone
+from app.indexing.embedding_cache import EmbeddingCache
+from app.indexing.ingest import batched, iter_catalog_records
+from app.indexing.manifest import METADATA_CHANGED, UNCHANGED, IndexManifest, ManifestDiff
+from app.indexing.rate_limit import TokenBucket
+from app.retrieval.local_backend import catalog_paths
+from app.utils.precomputed import invalidate_precomputed
+from app.utils.resilience import CircuitOpenError, UpstreamPolicy, is_transient
 
 load_dotenv()
 
 class PineconeIndexer:
-    def __init__(self):
+    def __init__(self, batch_size=None, max_workers=None, requests_per_second=None, max_retries=None, use_vectors=None):
         self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
         self.index_name = "products-index"
         self.embedding_model = "llama-text-embed-v2"
         self.namespace = ""
 
+        self.batch_size = batch_size or int(os.getenv("INDEX_BATCH_SIZE", "20"))
+        self.max_workers = max_workers or int(os.getenv("INDEX_WORKERS", "4"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("INDEX_MAX_RETRIES", "6"))
+        # Shared by every worker; the bucket backs off on 429 and recovers on success
+        rate = requests_per_second or float(os.getenv("INDEX_REQUESTS_PER_SECOND", "2"))
+        self.limiter = TokenBucket(rate=rate, capacity=max(1.0, float(self.max_workers)))
+        self.manifest_path = os.getenv("INDEX_MANIFEST_PATH", "data/.index_manifest.json")
+        self.chunksize = int(os.getenv("INDEX_CHUNK_SIZE", "2000"))
+        self.max_in_flight = self.max_workers * 2
+
+        # Upsert raw vectors from the embedding cache instead of upsert_records
+        self.use_vectors = use_vectors if use_vectors is not None else os.getenv("INDEX_UPSERT_MODE", "records") == "vectors"
+        self.embedding_cache = EmbeddingCache(
+            os.getenv("EMBEDDING_CACHE_DIR", "data/.embedding_cache"), self.embedding_model
+        )
+        self.embed_batch_size = int(os.getenv("INDEX_EMBED_BATCH_SIZE", "10"))
+        embed_workers = int(os.getenv("INDEX_EMBED_WORKERS", "4"))
+        self._embed_pool = ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="embed")
+        # One pooled session keeps connections to the embedding API alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=embed_workers * self.max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.embed_calls = 0
+        self._stats_lock = threading.Lock()
+        # Retry budget, hedging and circuit breaking per (upstream, operation);
+        # INDEX_HEDGE=1 sends a backup write when one is slower than the p95
+        self.retry_budget = float(os.getenv("INDEX_RETRY_BUDGET", "600"))
+        self._policies = {}
+
     def create_index_if_not_exists(self):
         if self.index_name not in self.pc.list_indexes().names():
             print(f"Creating index: {self.index_name}")
@@ -27,112 +68,215 @@ class PineconeIndexer:
                     }
                 }
             )
-        self.index = self.pc.Index(self.index_name)
+        self.index = self.pc.Index(self.index_name, pool_threads=self.max_workers)
         print(f"Index {self.index_name} created or already exists", self.index)
 
-    def index_products(self, csv_path):
-        df = pd.read_csv(csv_path)
-        print(f"Loaded {len(df)} products from CSV")
-
-        batch_size = 20  # Reduced batch size
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i + batch_size]
-            self._process_batch(batch)
-            print(f"Indexed batch {i//batch_size + 1}/{(len(df) + batch_size - 1)//batch_size}")
-            # Add delay between batches to avoid rate limiting
-            delay = 5  # 5 seconds delay between batches
-            print(f"Waiting {delay} seconds before next batch...")
-            time.sleep(delay)
-
-    def _process_batch(self, batch):
-        records = []
-
-        for _, row in batch.iterrows():
-            product_id = row["id"]
-            description = row["description_keywords"]
-
-            if pd.isna(description) or not description.strip():
-                print(f"Skipping product {product_id} with empty description")
-                continue
-
-            record = {
-                "_id": product_id,
-                "text": description,  # Field that will be embedded
-                "name": row["name"],
-                "price": row["price"] if not pd.isna(row["price"]) else 0.0,
-                "image_url": row["image_url"],
-                "product_link": row["product_link"],
-                "search_query": row["search_query"] if not pd.isna(row["search_query"]) else ""
-            }
-            records.append(record)
-
-        if records:
+    def _policy(self, upstream, operation):
+        key = (upstream, operation)
+        with self._stats_lock:
+            if key not in self._policies:
+                policy = UpstreamPolicy.from_env("INDEX", upstream, operation, base_delay=1.0, max_delay=60.0,
+                                                 budget=self.retry_budget)
+                policy.max_retries = self.max_retries
+                self._policies[key] = policy
+            return self._policies[key]
+
+    def _call(self, func, upstream="pinecone", operation="upsert"):
+        def log_retry(attempt, error, delay):
+            print(f"Retry {attempt}/{self.max_retries} in {delay:.1f}s after error: {error} "
+                  f"(rate now {self.limiter.rate:.2f} req/s)")
+
+        return self._policy(upstream, operation).call(func, limiter=self.limiter, on_retry=log_retry)
+
+    def index_products(self, csv_paths, dry_run=False, full=False):
+        if isinstance(csv_paths, str):
+            csv_paths = [csv_paths]
+        print(f"Streaming products from {', '.join(csv_paths)} in chunks of {self.chunksize} rows")
+
+        manifest = IndexManifest(self.manifest_path, self.index_name, self.namespace, self.embedding_model)
+        if full:
+            manifest.products = {}
+
+        diff = ManifestDiff()
+        seen_ids = set()
+        stats = {}
+        progress = {"tasks": 0, "records": 0, "failed": 0}
+        start = time.perf_counter()
+        in_flight = {}
+
+        def finish(future):
+            label, size, on_success = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                progress["failed"] += 1
+                print(f"{label} batch failed after retries: {e}")
+                return
+            # Manifest updates happen on this thread only, so no locking is needed
+            on_success(result)
+            progress["tasks"] += 1
+            progress["records"] += size
+            elapsed = time.perf_counter() - start
+            print(f"{label} batch done - {progress['records']} records written, {stats.get('rows', 0)} rows read "
+                  f"in {elapsed:.1f}s ({stats.get('rows', 0) / elapsed if elapsed else 0.0:.1f} rows/s)")
+
+        def submit(pool, label, func, arg, size, on_success):
+            # Bound the number of queued batches so memory does not grow with the catalog
+            while len(in_flight) >= self.max_in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future)
+            in_flight[pool.submit(func, arg)] = (label, size, on_success)
+
+        to_embed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="indexer") as pool:
+            for record in iter_catalog_records(csv_paths, stats, self.chunksize):
+                # The first file listing a product wins, so ids shared by the
+                # catalogs are not rewritten on every run
+                if record["_id"] in seen_ids:
+                    stats["duplicates"] = stats.get("duplicates", 0) + 1
+                    continue
+                seen_ids.add(record["_id"])
+                status = manifest.classify(record)
+                diff.add(status, record["_id"])
+                if status == UNCHANGED:
+                    continue
+                if dry_run:
+                    print(f"  {status}: {record['_id']}")
+                elif status == METADATA_CHANGED:
+                    # Price/image/link changes keep their vectors and only update metadata
+                    submit(pool, "Metadata update", self._update_metadata, record, 1,
+                           lambda result: manifest.record([result]))
+                else:
+                    # New and re-worded products need embeddings
+                    to_embed.append(record)
+                    if len(to_embed) >= self.batch_size:
+                        submit(pool, "Upsert", self._upsert_batch, to_embed, len(to_embed), manifest.record)
+                        to_embed = []
+
+            if to_embed and not dry_run:
+                submit(pool, "Upsert", self._upsert_batch, to_embed, len(to_embed), manifest.record)
+
+            # Products no longer in any CSV are removed from the index
+            diff.removed = manifest.removed_ids(seen_ids)
+            for ids in batched(diff.removed, 1000):
+                if dry_run:
+                    for product_id in ids:
+                        print(f"  removed: {product_id}")
+                else:
+                    submit(pool, "Delete", self._delete_ids, ids, len(ids), manifest.forget)
+
+            while in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future)
+
+        elapsed = time.perf_counter() - start
+        print(f"Read {stats.get('rows', 0)} rows ({stats.get('skipped', 0)} skipped, "
+              f"{stats.get('duplicates', 0)} duplicate ids) in {elapsed:.1f}s "
+              f"({stats.get('rows', 0) / elapsed if elapsed else 0.0:.1f} rows/s)")
+        print(f"Changes since last run: {diff.summary()}")
+        if dry_run:
+            return diff
+
+        # Only successful writes are recorded, so failures are retried next run
+        manifest.save()
+        print(f"Wrote {progress['records']} records in {progress['tasks']} batches, {progress['failed']} failed batches")
+        print(f"Embedding cache: {self.embedding_cache.hits} hits, {self.embedding_cache.misses} misses, "
+              f"{self.embed_calls} embedding API calls")
+        # Precomputed profiles that list a changed product stop being served
+        invalidated = invalidate_precomputed(diff)
+        if invalidated is not None:
+            print(f"Precomputed recommendations: {invalidated['invalid']} invalidated, "
+                  f"{invalidated['outdated']} outdated; run `python run.py precompute` to rebuild them")
+        if progress["failed"]:
+            raise RuntimeError(f"{progress['failed']} indexing batches failed; rerun to retry them")
+        return diff
+
+    def _update_metadata(self, record):
+        metadata = {k: v for k, v in record.items() if k not in ("_id", "text")}
+        self._call(lambda: self.index.update(id=record["_id"], set_metadata=metadata, namespace=self.namespace), operation="update")
+        return record
+
+    def _delete_ids(self, ids):
+        self._call(lambda: self.index.delete(ids=ids, namespace=self.namespace), operation="delete")
+        return ids
+
+    def _upsert_batch(self, records):
+        if not self.use_vectors:
             # Use upsert_records for indexes with integrated embedding
             try:
-                self.index.upsert_records(namespace=self.namespace, records=records)
-                print(f"Successfully upserted {len(records)} records")
+                self._call(lambda: self.index.upsert_records(namespace=self.namespace, records=records))
+                return records
             except Exception as e:
+                # Only a request the index rejects falls back; outages, quota
+                # errors and an open circuit are no reason to switch methods
+                if is_transient(e) or isinstance(e, CircuitOpenError):
+                    raise
                 print(f"Error upserting records: {e}")
                 # Fallback to standard upsert if upsert_records is not available
                 print("Falling back to standard upsert method")
 
-                # We need to generate embeddings for the fallback method
-                import requests
-
-                # Process in smaller batches to avoid hitting limits
-                max_batch = 10  # Smaller batch size for fallback
-                for i in range(0, len(records), max_batch):
-                    batch_records = records[i:i + max_batch]
-                    texts = [r["text"] for r in batch_records]
-
-                    # Get embeddings from Pinecone
-                    embedding_api_url = "https://api.pinecone.io/embedding/v1/embed"
-                    headers = {
-                        "accept": "application/json",
-                        "content-type": "application/json",
-                        "Api-Key": os.getenv("PINECONE_API_KEY")
-                    }
-                    payload = {
-                        "model": self.embedding_model,
-                        "texts": texts
-                    }
+        # Embed through the local cache and upsert raw vectors
+        embeddings = self._embed_texts([r["text"] for r in records])
+        vectors = []
+        for record, embedding in zip(records, embeddings):
+            metadata = {k: v for k, v in record.items() if k != "_id"}
+            vectors.append({
+                "id": record["_id"],
+                "values": embedding,
+                "metadata": metadata  # Includes the text field
+            })
+
+        self._call(lambda: self.index.upsert(vectors=vectors, namespace=self.namespace))
+        print(f"Upserted {len(vectors)} vectors using the vector upsert method")
+        return records
+
+    def _embed_texts(self, texts):
+        vectors, missing = self.embedding_cache.get_many(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            # Fetch the misses in concurrent batches over the pooled session
+            chunks = list(batched(missing_texts, self.embed_batch_size))
+            results = self._embed_pool.map(lambda chunk: self._call(lambda: self._embed(chunk), upstream="pinecone", operation="embed"), chunks)
+            fetched = [vector for result in results for vector in result]
+            self.embedding_cache.put_many(missing_texts, fetched)
+            for position, vector in zip(missing, fetched):
+                vectors[position] = vector
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def _embed(self, texts):
+        # Get embeddings from Pinecone
+        embedding_api_url = os.getenv("PINECONE_EMBED_URL", "https://api.pinecone.io/embedding/v1/embed")
+        headers = {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "Api-Key": os.getenv("PINECONE_API_KEY")
+        }
+        payload = {
+            "model": self.embedding_model,
+            "texts": texts
+        }
+
+        with self._stats_lock:
+            self.embed_calls += 1
+        response = self.session.post(embedding_api_url, headers=headers, json=payload)
+        # Raises HTTPError carrying the status so 429/5xx are retried
+        response.raise_for_status()
+        return response.json()["embeddings"]
 
-                    response = requests.post(embedding_api_url, headers=headers, json=payload)
-                    if response.status_code != 200:
-                        raise Exception(f"Error getting embeddings: {response.text}")
-
-                    embeddings = response.json()["embeddings"]
-
-                    # Create vectors with embeddings
-                    vectors = []
-                    for idx, record in enumerate(batch_records):
-                        vector_id = record.pop("_id")
-                        text = record.pop("text")
-
-                        vector = {
-                            "id": vector_id,
-                            "values": embeddings[idx],
-                            "metadata": record
-                        }
-                        # Add text to metadata
-                        vector["metadata"]["text"] = text
-                        vectors.append(vector)
-
-                    # Upsert this batch
-                    self.index.upsert(vectors=vectors, namespace=self.namespace)
-                    print(f"Upserted {len(vectors)} vectors using fallback method")
-
-                    # Add delay between fallback batches to avoid rate limiting
-                    if i + max_batch < len(records):  # If not the last batch
-                        delay = 5  # 5 seconds delay
-                        print(f"Waiting {delay} seconds before next fallback batch...")
-                        time.sleep(delay)
-
-def main():
-    indexer = PineconeIndexer()
-    indexer.create_index_if_not_exists()
-    indexer.index_products("data/amazon_pet_toys_mx_db.csv")
-    print("Indexing complete!")
+def main(batch_size=None, max_workers=None, requests_per_second=None, dry_run=False, full=False, csv_paths=None,
+         use_vectors=None):
+    indexer = PineconeIndexer(
+        batch_size=batch_size,
+        max_workers=max_workers,
+        requests_per_second=requests_per_second,
+        use_vectors=use_vectors,
+    )
+    if not dry_run:
+        indexer.create_index_if_not_exists()
+    indexer.index_products(csv_paths or catalog_paths(), dry_run=dry_run, full=full)
+    print("Dry run complete, nothing was written" if dry_run else "Indexing complete!")
 
 if __name__ == "__main__":
     main()
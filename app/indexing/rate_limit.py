@@ -0,0 +1,107 @@
+import time
+import random
+import threading
+from typing import Callable, Optional, TypeVar
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout as RequestsTimeout
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, RequestsConnectionError, RequestsTimeout, Urllib3HTTPError)
+
+class TokenBucket:
+    """Thread-safe token bucket with additive-increase/multiplicative-decrease.
+
+    ``acquire`` blocks until a token is available. ``penalize`` halves the
+    refill rate after a 429 and ``reward`` creeps it back up to ``max_rate``
+    so throughput settles at the provider's real quota.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: float = 0.05):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def reward(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+def error_status(error: Exception) -> Optional[int]:
+    # Pinecone raises PineconeApiException(status=...); requests/httpx errors
+    # carry the status on their response.
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: Exception) -> bool:
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, TRANSIENT_ERRORS)
+
+def call_with_backoff(
+    func: Callable[[], T],
+    limiter: Optional[TokenBucket] = None,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    on_retry: Optional[Callable[[int, Exception, float], None]] = None,
+    budget: Optional[float] = None,
+    retryable: Callable[[Exception], bool] = is_retryable,
+) -> T:
+    # budget caps the seconds spent on one call, retries and sleeps included
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            result = func()
+        except Exception as e:
+            if attempt >= max_retries or not retryable(e):
+                raise
+            if limiter is not None and error_status(e) == 429:
+                limiter.penalize()
+            # Full jitter keeps parallel workers from retrying in lockstep
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if budget is not None and time.monotonic() - started + delay >= budget:
+                raise
+            attempt += 1
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+            time.sleep(delay)
+            continue
+        if limiter is not None:
+            limiter.reward()
+        return result
@@ -0,0 +1,44 @@
+import os
+import logging
+import threading
+from typing import Any, Dict, List
+from app.retrieval.base import RetrievalBackend
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_backend = None
+_lock = threading.Lock()
+
+def create_retrieval_backend(name: str) -> RetrievalBackend:
+    if name == "pinecone":
+        from app.retrieval.pinecone_backend import PineconeBackend
+        return PineconeBackend()
+    if name == "local":
+        from app.retrieval.local_backend import LocalBM25Backend
+        return LocalBM25Backend()
+    if name == "hybrid":
+        from app.retrieval.hybrid_backend import HybridBackend
+        return HybridBackend(create_retrieval_backend(os.getenv("HYBRID_VECTOR_BACKEND", "pinecone")))
+    raise ValueError(f"Unknown retrieval backend: {name}")
+
+def get_retrieval_backend() -> RetrievalBackend:
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                name = os.getenv("RETRIEVAL_BACKEND", "pinecone").lower()
+                _backend = create_retrieval_backend(name)
+                logger.info(f"Using '{_backend.name}' retrieval backend")
+    return _backend
+
+def set_retrieval_backend(backend: RetrievalBackend):
+    global _backend
+    with _lock:
+        _backend = backend
+
+def search_products(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    return get_retrieval_backend().search(query, top_k)
+
+async def asearch_products(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    return await get_retrieval_backend().asearch(query, top_k)
@@ -0,0 +1,21 @@
+import asyncio
+from typing import Any, Dict, List
+
+class RetrievalBackend:
+    """Interface for product retrieval engines used by the recommendation graph.
+
+    ``search`` returns product dicts with ``id``, ``score``, ``name``,
+    ``price``, ``image_url``, ``product_link``, ``description`` and
+    ``search_query`` keys, best match first.
+    """
+
+    name = "base"
+
+    def warm_up(self):
+        pass
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def asearch(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.search, query, top_k)
@@ -0,0 +1,133 @@
+import os
+import time
+import logging
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import pandas as pd
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Only the start of a description reaches the explanation prompt
+DESCRIPTION_CHARS = int(os.getenv("CATALOG_DESCRIPTION_CHARS", "200"))
+
+class StringColumn:
+    """Strings packed into one ``str`` with an offsets array.
+
+    A million short strings cost one object and 8 bytes per row here,
+    instead of a ``str`` object (~50 bytes of overhead) each.
+    """
+
+    __slots__ = ("_data", "_offsets")
+
+    def __init__(self, values: Iterable[str]):
+        values = list(values)
+        self._data = "".join(values)
+        self._offsets = array("q", [0])
+        total = 0
+        for value in values:
+            total += len(value)
+            self._offsets.append(total)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self._data[self._offsets[row]:self._offsets[row + 1]]
+
+def _strings(series: pd.Series) -> List[str]:
+    return series.fillna("").astype(str).tolist()
+
+class ProductCatalog:
+    """Read-only product fields by id, stored column-wise.
+
+    Search hits only carry ids and scores; the display fields are
+    hydrated from here.
+    """
+
+    __slots__ = ("ids", "_rows", "names", "prices", "image_urls", "product_links", "search_queries", "descriptions")
+
+    def __init__(self, df: pd.DataFrame, description_chars: int = DESCRIPTION_CHARS):
+        self.ids: List[str] = df["id"].astype(str).tolist()
+        self._rows: Dict[str, int] = {product_id: row for row, product_id in enumerate(self.ids)}
+        self.names = StringColumn(_strings(df["name"]))
+        self.prices = array("d", pd.to_numeric(df["price"], errors="coerce").fillna(0.0).astype(float).tolist())
+        self.image_urls = StringColumn(_strings(df["image_url"]))
+        self.product_links = StringColumn(_strings(df["product_link"]))
+        self.search_queries = StringColumn(_strings(df["search_query"]))
+        self.descriptions = StringColumn(
+            text[:description_chars] if description_chars else text for text in _strings(df["description_keywords"])
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._rows
+
+    def row(self, product_id: str) -> Optional[int]:
+        return self._rows.get(product_id)
+
+    def product_at(self, row: int, score: float = 0.0) -> Dict[str, Any]:
+        return {
+            "id": self.ids[row],
+            "score": score,
+            "name": self.names[row],
+            "price": self.prices[row],
+            "image_url": self.image_urls[row],
+            "product_link": self.product_links[row],
+            "description": self.descriptions[row],
+            "search_query": self.search_queries[row],
+        }
+
+    def hydrate(self, hits: Sequence[Tuple[str, float]]) -> Tuple[List[Optional[Dict[str, Any]]], List[str]]:
+        # One product per hit, or None for ids the catalog does not know,
+        # plus the list of those ids
+        products: List[Optional[Dict[str, Any]]] = []
+        missing = []
+        for product_id, score in hits:
+            row = self._rows.get(product_id)
+            if row is None:
+                products.append(None)
+                missing.append(product_id)
+            else:
+                products.append(self.product_at(row, score))
+        return products, missing
+
+_catalog: Optional[ProductCatalog] = None
+_catalog_loaded = False
+_lock = threading.Lock()
+
+def get_product_catalog() -> Optional[ProductCatalog]:
+    # Loaded once per process from the same CSVs the indexer reads. None
+    # when hydration is disabled or the catalogs are missing, in which case
+    # search asks the index for every field.
+    global _catalog, _catalog_loaded
+    if not _catalog_loaded:
+        with _lock:
+            if not _catalog_loaded:
+                _catalog = _load_product_catalog()
+                _catalog_loaded = True
+    return _catalog
+
+def _load_product_catalog() -> Optional[ProductCatalog]:
+    from app.retrieval.local_backend import catalog_paths, load_catalog
+
+    if os.getenv("CATALOG_HYDRATION", "1").lower() in ("0", "false", "no"):
+        return None
+    paths = catalog_paths()
+    try:
+        start = time.perf_counter()
+        catalog = ProductCatalog(load_catalog(paths))
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"Product catalog unavailable, search will request all fields: {str(e)}")
+        return None
+    logger.info(f"Loaded {len(catalog)} products into the catalog in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return catalog
+
+def reset_product_catalog():
+    global _catalog, _catalog_loaded
+    with _lock:
+        _catalog = None
+        _catalog_loaded = False
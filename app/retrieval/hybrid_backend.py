@@ -0,0 +1,103 @@
+import os
+import time
+import logging
+from typing import Any, Dict, List, Optional
+from app.retrieval.base import RetrievalBackend
+from app.retrieval.local_backend import LocalBM25Backend
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def reciprocal_rank_fusion(rankings: List[List[str]], weights: List[float], k: float = 60.0) -> Dict[str, float]:
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, product_id in enumerate(ranking):
+            fused[product_id] = fused.get(product_id, 0.0) + weight / (k + rank + 1)
+    return fused
+
+class HybridBackend(RetrievalBackend):
+    """Vector candidates re-scored by BM25 and merged with reciprocal rank fusion.
+
+    The vector engine returns ``candidate_k`` hits. The lexical index ranks
+    those hits together with its own best ``lexical_k`` matches from the
+    whole catalog, so exact constraints like "20-60 lbs" can surface products
+    the embedding missed.
+    """
+
+    name = "hybrid"
+
+    def __init__(
+        self,
+        vector_backend: RetrievalBackend,
+        lexical_backend: Optional[LocalBM25Backend] = None,
+        candidate_k: Optional[int] = None,
+        lexical_k: Optional[int] = None,
+        vector_weight: Optional[float] = None,
+        lexical_weight: Optional[float] = None,
+        rrf_k: Optional[float] = None,
+    ):
+        self.vector_backend = vector_backend
+        self.lexical_backend = lexical_backend or LocalBM25Backend()
+        self.candidate_k = candidate_k or int(os.getenv("HYBRID_CANDIDATES", "50"))
+        self.lexical_k = lexical_k if lexical_k is not None else int(os.getenv("HYBRID_LEXICAL_CANDIDATES", "20"))
+        self.vector_weight = vector_weight if vector_weight is not None else float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+        self.lexical_weight = lexical_weight if lexical_weight is not None else float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+        self.rrf_k = rrf_k or float(os.getenv("HYBRID_RRF_K", "60"))
+        self.last_fusion_seconds = 0.0
+
+    def warm_up(self):
+        self.vector_backend.warm_up()
+
+    def fuse(self, query: str, candidates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        lexical = self.lexical_backend
+        scores = lexical.index.scores(query)
+
+        by_id = {product["id"]: product for product in candidates}
+        vector_ranking = [product["id"] for product in candidates]
+
+        # Rank the vector candidates and the catalog-wide lexical hits by BM25
+        catalog = lexical.catalog
+        lexical_pool = {
+            product_id: float(scores[catalog.row(product_id)])
+            for product_id in vector_ranking if product_id in catalog
+        }
+        if self.lexical_k:
+            for doc_id, score in lexical.index.top_k(query, self.lexical_k):
+                lexical_pool.setdefault(catalog.ids[doc_id], score)
+        lexical_ranking = sorted(
+            (product_id for product_id, score in lexical_pool.items() if score > 0),
+            key=lambda product_id: -lexical_pool[product_id],
+        )
+
+        fused = reciprocal_rank_fusion(
+            [vector_ranking, lexical_ranking], [self.vector_weight, self.lexical_weight], self.rrf_k
+        )
+        results = []
+        for product_id in sorted(fused, key=lambda product_id: -fused[product_id])[:top_k]:
+            product = by_id.get(product_id)
+            if product is None:
+                results.append(catalog.product_at(catalog.row(product_id), fused[product_id]))
+            else:
+                results.append(dict(product, score=fused[product_id]))
+
+        self.last_fusion_seconds = time.perf_counter() - start
+        logger.info(
+            f"Hybrid fusion of {len(vector_ranking)} vector and {len(lexical_ranking)} lexical candidates "
+            f"took {self.last_fusion_seconds * 1000:.2f} ms"
+        )
+        return results
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        if not query or query.strip() == "":
+            logger.warning("Empty query provided to hybrid search")
+            return []
+        candidates = self.vector_backend.search(query, max(self.candidate_k, top_k))
+        return self.fuse(query, candidates, top_k)
+
+    async def asearch(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        if not query or query.strip() == "":
+            logger.warning("Empty query provided to hybrid search")
+            return []
+        candidates = await self.vector_backend.asearch(query, max(self.candidate_k, top_k))
+        return self.fuse(query, candidates, top_k)
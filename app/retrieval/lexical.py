@@ -0,0 +1,80 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import Iterable, List
+import numpy as np
+
+# Keep hyphenated and dotted runs together so "20-60" or "2.5" stay one token
+_TOKEN = re.compile(r"\w+(?:[-.]\w+)*")
+
+def fold_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def tokenize(text: str) -> List[str]:
+    if not text:
+        return []
+    return _TOKEN.findall(fold_accents(text.lower()))
+
+class BM25Index:
+    """Okapi BM25 over an inverted index stored as flat NumPy arrays.
+
+    Postings are grouped by term: ``indptr[t]:indptr[t + 1]`` slices
+    ``doc_ids`` and ``weights`` for term ``t``. Weights are precomputed at
+    build time, so a query is a handful of vectorized adds.
+    """
+
+    def __init__(self, documents: Iterable[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        vocabulary = {}
+        term_ids: List[int] = []
+        posting_docs: List[int] = []
+        term_freqs: List[int] = []
+        doc_lengths: List[int] = []
+
+        for doc_id, text in enumerate(documents):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                posting_docs.append(doc_id)
+                term_freqs.append(tf)
+
+        self.vocabulary = vocabulary
+        self.num_docs = len(doc_lengths)
+
+        term_array = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_array, kind="stable")
+        self.doc_ids = np.asarray(posting_docs, dtype=np.int32)[order]
+        tf = np.asarray(term_freqs, dtype=np.float32)[order]
+        df = np.bincount(term_array, minlength=len(vocabulary))
+        self.indptr = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+
+        lengths = np.asarray(doc_lengths, dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.num_docs else 0.0
+        idf = np.log1p((self.num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1.0 - b + b * lengths[self.doc_ids] / max(avg_length, 1e-9))
+        self.weights = (np.repeat(idf, df) * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+    def _term_ids(self, query: str) -> List[int]:
+        return [self.vocabulary[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocabulary]
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term_id in self._term_ids(query):
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            # Doc ids are unique within a posting list, so fancy-index add is safe
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[tuple]:
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores > 0)
+        if matched.size == 0:
+            return []
+        if matched.size > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(i), float(scores[i])) for i in best]
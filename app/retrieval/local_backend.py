@@ -0,0 +1,56 @@
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import pandas as pd
+from app.retrieval.base import RetrievalBackend
+from app.retrieval.catalog import ProductCatalog
+from app.retrieval.lexical import BM25Index
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CATALOG_PATHS = [str(PROJECT_ROOT / "data" / "amazon_pet_toys_mx_db.csv")]
+
+def catalog_paths() -> List[str]:
+    configured = os.getenv("CATALOG_PATHS", "")
+    paths = [p.strip() for p in configured.split(",") if p.strip()]
+    return paths or DEFAULT_CATALOG_PATHS
+
+def load_catalog(paths: Sequence[str]) -> pd.DataFrame:
+    frames = [pd.read_csv(path) for path in paths]
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    df = df[df["description_keywords"].notna() & (df["description_keywords"].str.strip() != "")]
+    # The first catalog listing a product wins, as in the indexer
+    return df.drop_duplicates(subset="id", keep="first").reset_index(drop=True)
+
+class LocalBM25Backend(RetrievalBackend):
+    """In-process BM25 search over the CSV catalogs, built at startup."""
+
+    name = "local"
+
+    def __init__(self, paths: Optional[Sequence[str]] = None):
+        start = time.perf_counter()
+        df = load_catalog(paths or catalog_paths())
+        # BM25 doc ids are catalog rows
+        self.catalog = ProductCatalog(df)
+        self.index = BM25Index(df["description_keywords"])
+        logger.info(
+            f"Built local BM25 index over {len(self.catalog)} products "
+            f"({len(self.index.vocabulary)} terms) in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        if not query or query.strip() == "":
+            logger.warning("Empty query provided to local search")
+            return []
+        return [
+            self.catalog.product_at(doc_id, score)
+            for doc_id, score in self.index.top_k(query, top_k)
+        ]
+
+    async def asearch(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        # Sub-millisecond CPU work; a thread hop would cost more than the search
+        return self.search(query, top_k)
@@ -0,0 +1,26 @@
+import logging
+from typing import Any, Dict, List
+from app.retrieval.base import RetrievalBackend
+from app.retrieval.catalog import get_product_catalog
+from app.utils.clients import get_pinecone_index
+from app.utils.pinecone_utils import asearch_products, search_products
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class PineconeBackend(RetrievalBackend):
+    name = "pinecone"
+
+    def warm_up(self):
+        get_product_catalog()
+        # Open the connection pool so the first search skips the TLS handshake
+        try:
+            get_pinecone_index().describe_index_stats()
+        except Exception as e:
+            logger.warning(f"Pinecone warm-up failed: {str(e)}")
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        return search_products(query, top_k)
+
+    async def asearch(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        return await asearch_products(query, top_k)
@@ -0,0 +1,254 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+def normalize_quiz(formatted_quiz: str) -> str:
+    # Answers arrive one per line; line order, casing and spacing do not
+    # change the profile, so they are dropped from the cache key.
+    lines = (normalize_text(line) for line in (formatted_quiz or "").splitlines())
+    return "\n".join(sorted(line for line in lines if line))
+
+def quiz_cache_key(formatted_quiz: str) -> str:
+    return hashlib.sha256(normalize_quiz(formatted_quiz).encode("utf-8")).hexdigest()
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.evictions += 1
+            self.misses += 1
+            return default
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Any]:
+        return [self.get(key) for key in keys]
+
+    # In memory, so the async variants answer on the event loop directly
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        return self.get(key, default)
+
+    async def aget_many(self, keys: Sequence[Hashable]) -> List[Any]:
+        return self.get_many(keys)
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def flush(self):
+        pass
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+class ProcessLocalConnection:
+    """A SQLite connection in WAL mode, reopened in each process.
+
+    Connections must not cross a fork, and WAL lets readers in every
+    worker proceed while one of them writes. ``schema`` statements run
+    each time the connection is opened.
+    """
+
+    def __init__(self, path: str, timeout: float, schema: Sequence[str] = ()):
+        self.path = path
+        self.timeout = timeout
+        self.schema = schema
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+
+    def get(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+# Cache writes wait for SQLite's write lock here rather than on the event loop
+_cache_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-writer")
+
+class SQLiteCache:
+    """TTL cache in a SQLite table that every worker process shares.
+
+    Values are stored as JSON, so tuples come back as lists. Reads give up
+    after ``CACHE_READ_TIMEOUT`` and count as a miss; async code should use
+    ``aget``/``aget_many``, which read in a worker thread. Writes are queued
+    to a background thread and dropped if the table stays locked. When the
+    table outgrows ``maxsize`` the oldest entries are evicted first.
+    """
+
+    def __init__(self, path: str, table: str, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.path = path
+        self.table = table
+        self.maxsize = maxsize
+        self.ttl = ttl
+        schema = [f"CREATE TABLE IF NOT EXISTS {table} "
+                  "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"]
+        # Separate connections so a writer waiting on the lock never holds up reads
+        self._reader = ProcessLocalConnection(path, float(os.getenv("CACHE_READ_TIMEOUT", "0.05")), schema)
+        self._writer = ProcessLocalConnection(path, float(os.getenv("CACHE_WRITE_TIMEOUT", "1.0")), schema)
+        self._read_lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return key if isinstance(key, str) else json.dumps(key, ensure_ascii=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self.get_many([key])[0]
+        return default if value is None else value
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Any]:
+        # One query for all keys; None for each miss
+        keys = [self._key(key) for key in keys]
+        try:
+            with self._read_lock:
+                rows = self._reader.get().execute(
+                    f"SELECT key, value, expires_at FROM {self.table} WHERE key IN ({', '.join('?' * len(keys))})",
+                    keys,
+                ).fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Cache {self.table} read failed, treating it as a miss: {str(e)}")
+            rows = []
+        now = time.time()
+        found = {key: json.loads(value) for key, value, expires_at in rows if expires_at is None or expires_at > now}
+        hits = sum(1 for key in keys if key in found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return [found.get(key) for key in keys]
+
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        return await asyncio.to_thread(self.get, key, default)
+
+    async def aget_many(self, keys: Sequence[Hashable]) -> List[Any]:
+        return await asyncio.to_thread(self.get_many, keys)
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        _cache_writer.submit(self._write, self._key(key), json.dumps(value, ensure_ascii=False), expires_at)
+
+    def _write(self, key: str, value: str, expires_at: Optional[float]):
+        try:
+            conn = self._writer.get()
+            # REPLACE gives the entry a new rowid, so rowid order is write order
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            # Sweep every few writes rather than on each one
+            self._writes += 1
+            if self._writes % max(1, min(100, self.maxsize // 10)) == 0:
+                self._evict(conn)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Cache {self.table} write dropped: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        evicted = conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),)).rowcount
+        excess = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.maxsize
+        if excess > 0:
+            evicted += conn.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN "
+                f"(SELECT rowid FROM {self.table} ORDER BY rowid LIMIT ?)", (excess,)
+            ).rowcount
+        self.evictions += evicted
+
+    def flush(self):
+        # Wait for queued writes, e.g. before reading back entries just set
+        _cache_writer.submit(lambda: None).result()
+
+    def clear(self):
+        _cache_writer.submit(lambda: self._writer.get().execute(f"DELETE FROM {self.table}")).result()
+
+    def __len__(self) -> int:
+        with self._read_lock:
+            return self._reader.get().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        # Hits and misses are this process's; size is the shared table's
+        total = self.hits + self.misses
+        try:
+            size = len(self)
+        except sqlite3.Error:
+            size = 0
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+def create_cache(name: str, maxsize: int, ttl: Optional[float] = None):
+    # CACHE_BACKEND=sqlite shares entries between worker processes
+    if os.getenv("CACHE_BACKEND", "memory").lower() == "sqlite":
+        path = os.getenv("CACHE_PATH", "data/.recommendation_cache.sqlite3")
+        return SQLiteCache(path, table=f"{name}_cache", maxsize=maxsize, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Tuple
+import httpx
+from dotenv import load_dotenv
+from pinecone import Pinecone
+from langchain_openai import ChatOpenAI
+
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PINECONE_INDEX_NAME = "products-index"
+
+# Connection pool sizing shared by every process-wide client
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "8"))
+
+_lock = threading.RLock()
+_http_client = None
+_async_http_client = None
+_pinecone_client = None
+_pinecone_index = None
+_chat_models: Dict[Tuple[str, float], ChatOpenAI] = {}
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+    )
+
+def get_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(limits=_http_limits(), timeout=HTTP_TIMEOUT)
+    return _http_client
+
+def get_async_http_client() -> httpx.AsyncClient:
+    global _async_http_client
+    if _async_http_client is None:
+        with _lock:
+            if _async_http_client is None:
+                _async_http_client = httpx.AsyncClient(limits=_http_limits(), timeout=HTTP_TIMEOUT)
+    return _async_http_client
+
+def get_chat_model(model: str = "gpt-4o-mini", temperature: float = 0.7) -> ChatOpenAI:
+    key = (model, temperature)
+    chat_model = _chat_models.get(key)
+    if chat_model is None:
+        with _lock:
+            chat_model = _chat_models.get(key)
+            if chat_model is None:
+                chat_model = ChatOpenAI(
+                    temperature=temperature,
+                    model=model,
+                    http_client=get_http_client(),
+                    http_async_client=get_async_http_client(),
+                    # Token usage on streamed responses too, for the metrics endpoint
+                    stream_usage=True,
+                    # Retries and hedging are handled by the callers' UpstreamPolicy
+                    max_retries=0,
+                )
+                _chat_models[key] = chat_model
+    return chat_model
+
+def get_pinecone_client() -> Pinecone:
+    global _pinecone_client
+    if _pinecone_client is None:
+        api_key = os.getenv("PINECONE_API_KEY")
+        if not api_key:
+            raise RuntimeError("Pinecone API key not found")
+        with _lock:
+            if _pinecone_client is None:
+                _pinecone_client = Pinecone(api_key=api_key, pool_threads=PINECONE_POOL_THREADS)
+    return _pinecone_client
+
+def get_pinecone_index():
+    global _pinecone_index
+    if _pinecone_index is None:
+        pc = get_pinecone_client()
+        with _lock:
+            if _pinecone_index is None:
+                host = os.getenv("PINECONE_INDEX_HOST", "")
+                _pinecone_index = pc.Index(PINECONE_INDEX_NAME, host=host, pool_threads=PINECONE_POOL_THREADS)
+                logger.info(f"Connected to Pinecone index '{PINECONE_INDEX_NAME}'")
+    return _pinecone_index
+
+def warm_up() -> float:
+    # Build the chat clients and warm the configured retrieval backend up
+    # front. Only the backend opens a connection here; the OpenAI client is
+    # constructed but connects on its first call, which would otherwise cost
+    # tokens.
+    from app.retrieval.backends import get_retrieval_backend
+
+    start = time.perf_counter()
+    try:
+        get_chat_model()
+    except Exception as e:
+        logger.warning(f"Chat model warm-up failed: {str(e)}")
+    get_retrieval_backend().warm_up()
+    elapsed = time.perf_counter() - start
+    logger.info(f"Client warm-up completed in {elapsed * 1000:.1f} ms")
+    return elapsed
+
+async def close_clients():
+    global _http_client, _async_http_client, _pinecone_client, _pinecone_index
+    with _lock:
+        http_client, async_http_client = _http_client, _async_http_client
+        pinecone_index = _pinecone_index
+        _http_client = _async_http_client = None
+        _pinecone_client = _pinecone_index = None
+        _chat_models.clear()
+
+    if async_http_client is not None:
+        await async_http_client.aclose()
+    if http_client is not None:
+        http_client.close()
+    if pinecone_index is not None:
+        try:
+            pinecone_index.close()
+        except Exception as e:
+            logger.warning(f"Error closing Pinecone index: {str(e)}")
+    logger.info("Closed shared upstream clients")
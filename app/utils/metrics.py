@@ -0,0 +1,236 @@
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Minimal Prometheus text-format metrics so the service needs no extra dependency
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Per-request stage timings (name -> seconds), set by the timing middleware
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        raise NotImplementedError
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {child.value}"]
+
+class _GaugeChild(_CounterChild):
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, key, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            le_label = f'le="{le}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterator[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterator[str]]):
+        # Collectors emit ready-made exposition lines at scrape time
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+node_duration = registry.register(Histogram(
+    "pet_quiz_node_duration_seconds", "Duration of recommendation graph nodes", ["node"]))
+node_errors = registry.register(Counter(
+    "pet_quiz_node_errors_total", "Errors handled inside recommendation graph nodes", ["node"]))
+upstream_duration = registry.register(Histogram(
+    "pet_quiz_upstream_duration_seconds", "Duration of calls to external services", ["upstream", "operation"]))
+upstream_errors = registry.register(Counter(
+    "pet_quiz_upstream_errors_total", "Failed calls to external services", ["upstream", "operation"]))
+upstream_retries = registry.register(Counter(
+    "pet_quiz_upstream_retries_total", "Retried calls to external services", ["upstream", "operation"]))
+hedged_requests = registry.register(Counter(
+    "pet_quiz_hedged_requests_total", "Backup requests sent after the hedge delay", ["upstream", "operation"]))
+hedge_wins = registry.register(Counter(
+    "pet_quiz_hedge_wins_total", "Backup requests that answered before the original", ["upstream", "operation"]))
+circuit_state = registry.register(Gauge(
+    "pet_quiz_circuit_state", "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)", ["upstream"]))
+circuit_rejections = registry.register(Counter(
+    "pet_quiz_circuit_rejections_total", "Calls refused because the upstream circuit was open", ["upstream"]))
+llm_tokens = registry.register(Counter(
+    "pet_quiz_llm_tokens_total", "LLM tokens used, by node and token type", ["node", "type"]))
+degraded_stages = registry.register(Counter(
+    "pet_quiz_degraded_stages_total", "Stages that overran their deadline budget or failed", ["stage"]))
+time_to_first_content = registry.register(Histogram(
+    "pet_quiz_stream_time_to_first_content_seconds", "Time until the streaming endpoint sends its first event"))
+request_duration = registry.register(Histogram(
+    "pet_quiz_request_duration_seconds", "HTTP request duration by route", ["route"]))
+# Work a request does before the graph runs; the graph and clients are
+# built at startup, so this should stay in the microseconds
+request_setup_duration = registry.register(Histogram(
+    "pet_quiz_request_setup_seconds", "Per-request setup time before the recommendation graph runs",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)))
+
+def record_timing(name: str, seconds: float):
+    timings = request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+def instrument_node(name: str):
+    # Wrap an async graph node with a duration histogram and timing breakdown
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                node_duration.labels(name).observe(elapsed)
+                record_timing(name, elapsed)
+        return wrapper
+    return decorator
+
+@contextmanager
+def track_upstream(upstream: str, operation: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        upstream_errors.labels(upstream, operation).inc()
+        raise
+    finally:
+        upstream_duration.labels(upstream, operation).observe(time.perf_counter() - start)
+
+def record_token_usage(node: str, message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        llm_tokens.labels(node, "prompt").inc(usage["input_tokens"])
+    if usage.get("output_tokens"):
+        llm_tokens.labels(node, "completion").inc(usage["output_tokens"])
+
+_caches: Dict[str, object] = {}
+
+def register_cache(name: str, cache):
+    # Any object with a stats() dict of hits/misses/evictions/size
+    _caches[name] = cache
+
+def _collect_caches() -> Iterator[str]:
+    snapshots = {name: cache.stats() for name, cache in sorted(_caches.items())}
+    for metric, key, kind in (("hits_total", "hits", "counter"), ("misses_total", "misses", "counter"),
+                              ("evictions_total", "evictions", "counter"), ("entries", "size", "gauge")):
+        yield f"# TYPE pet_quiz_cache_{metric} {kind}"
+        for name, stats in snapshots.items():
+            yield f'pet_quiz_cache_{metric}{{cache="{_escape(name)}"}} {stats[key]}'
+
+registry.register_collector(_collect_caches)
@@ -1,49 +1,79 @@
 import os
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 from dotenv import load_dotenv
-from pinecone import Pinecone
+from app.utils.clients import get_pinecone_index
+from app.utils.resilience import UpstreamPolicy
+from app.retrieval.catalog import get_product_catalog
 
 load_dotenv()
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def search_products(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-    logger.info(f"Searching for products with query: '{query}', top_k={top_k}")
+HIT_FIELDS = ["name", "price", "image_url", "product_link", "search_query", "text"]
+NAMESPACE = ""
+
+# Searches are hedged after the p95 latency and retried within a 2s budget;
+# SEARCH_HEDGE, SEARCH_MAX_RETRIES and SEARCH_RETRY_BUDGET override this
+search_policy = UpstreamPolicy.from_env(
+    "SEARCH", "pinecone", "search", hedge=True, max_retries=2, base_delay=0.05, max_delay=0.5, budget=2.0
+)
+fetch_policy = UpstreamPolicy.from_env(
+    "SEARCH", "pinecone", "fetch", max_retries=2, base_delay=0.05, max_delay=0.5, budget=2.0
+)
+
+# Dedicated pool for blocking Pinecone calls so in-flight searches are not
+# capped by the default executor size
+_search_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SEARCH_MAX_WORKERS", "64")),
+    thread_name_prefix="pinecone-search",
+)
 
+def _prepare_search(query: str):
+    # (index, catalog) to search with, or None when there is nothing to search
     if not query or query.strip() == "":
         logger.warning("Empty query provided to search_products")
-        return []
-
+        return None
+    if not os.getenv("PINECONE_API_KEY"):
+        logger.error("Pinecone API key not found or invalid")
+        return None
     try:
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        if not pc or not os.getenv("PINECONE_API_KEY"):
-            logger.error("Pinecone API key not found or invalid")
-            return []
+        # Reuse the process-wide index handle and its connection pool;
+        # with a local catalog only ids and scores come back over the wire
+        return get_pinecone_index(), get_product_catalog()
+    except Exception as e:
+        logger.error(f"Unexpected error in search_products: {str(e)}")
+        return None
 
-        index = pc.Index("products-index")
-        namespace = ""
-        logger.info(f"Connected to Pinecone index 'products-index'")
+def _run_search(index, catalog, query: str, top_k: int):
+    return index.search(
+        namespace=NAMESPACE,
+        query={
+            "inputs": {"text": query},
+            "top_k": top_k
+        },
+        fields=[] if catalog is not None else HIT_FIELDS
+    )
 
-        try:
-            logger.info(f"Searching with integrated embedding")
-            results = index.search(
-                namespace=namespace,
-                query={
-                    "inputs": {"text": query},
-                    "top_k": top_k
-                },
-                fields=["name", "price", "image_url", "product_link", "search_query", "text"]
-            )
-            logger.info(f"Search completed successfully")
-        except Exception as e:
-            logger.error(f"Error performing search: {str(e)}")
-            return []
+def search_products(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    logger.info(f"Searching for products with query: '{query}', top_k={top_k}")
+    prepared = _prepare_search(query)
+    if prepared is None:
+        return []
+    index, catalog = prepared
+    try:
+        logger.info(f"Searching with integrated embedding")
+        results = search_policy.call(lambda: _run_search(index, catalog, query, top_k))
+        logger.info(f"Search completed successfully")
     except Exception as e:
-        logger.error(f"Unexpected error in search_products: {str(e)}")
+        logger.error(f"Error performing search: {str(e)}")
         return []
+    return _products_from_results(index, catalog, results)
 
+def _products_from_results(index, catalog, results) -> List[Dict[str, Any]]:
     products = []
 
     # Guard against None results
@@ -62,20 +92,11 @@ def search_products(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
             return products
 
         logger.info(f"Processing {len(hits)} hits from search")
+        if catalog is not None:
+            return _hydrate_hits(index, NAMESPACE, catalog, hits)
         for hit in hits:
             try:
-                fields = hit.get('fields', {})
-                product = {
-                    "id": hit.get('_id', ''),
-                    "score": hit.get('_score', 0.0),
-                    "name": fields.get('name', ''),
-                    "price": fields.get('price', 0.0),
-                    "image_url": fields.get('image_url', ''),
-                    "product_link": fields.get('product_link', ''),
-                    "description": fields.get('text', ''),
-                    "search_query": fields.get('search_query', '')
-                }
-                products.append(product)
+                products.append(_product_from_fields(hit.get('_id', ''), hit.get('_score', 0.0), hit.get('fields', {})))
             except Exception as e:
                 logger.error(f"Error processing hit: {str(e)}")
     except Exception as e:
@@ -83,3 +104,54 @@ def search_products(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
 
     logger.info(f"Returning {len(products)} products from search")
     return products
+
+def _product_from_fields(product_id: str, score: float, fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": product_id,
+        "score": score,
+        "name": fields.get('name', ''),
+        "price": fields.get('price', 0.0),
+        "image_url": fields.get('image_url', ''),
+        "product_link": fields.get('product_link', ''),
+        "description": fields.get('text', ''),
+        "search_query": fields.get('search_query', '')
+    }
+
+def _hydrate_hits(index, namespace: str, catalog, hits) -> List[Dict[str, Any]]:
+    products, missing = catalog.hydrate([(hit.get('_id', ''), hit.get('_score', 0.0)) for hit in hits])
+    if missing:
+        # The index has products the local catalog does not; fetch their
+        # stored fields rather than dropping them
+        logger.warning(f"{len(missing)} search hits not in the local catalog, fetching their fields")
+        try:
+            fetched = fetch_policy.call(lambda: index.fetch(ids=missing, namespace=namespace)).vectors
+        except Exception as e:
+            logger.error(f"Error fetching fields for hits missing from the catalog: {str(e)}")
+            fetched = {}
+        for position, hit in enumerate(hits):
+            vector = fetched.get(hit.get('_id', '')) if products[position] is None else None
+            if vector is not None:
+                products[position] = _product_from_fields(hit['_id'], hit.get('_score', 0.0), vector.metadata or {})
+    products = [product for product in products if product is not None]
+    logger.info(f"Returning {len(products)} products hydrated from the catalog")
+    return products
+
+async def asearch_products(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    # The Pinecone client is synchronous; run it on worker threads so the
+    # event loop keeps serving other requests while the search is in flight.
+    # Hedging happens here on the loop, and each attempt, backups included,
+    # takes its own search thread instead of blocking one on another.
+    logger.info(f"Searching for products with query: '{query}', top_k={top_k}")
+    prepared = _prepare_search(query)
+    if prepared is None:
+        return []
+    index, catalog = prepared
+    loop = asyncio.get_running_loop()
+    try:
+        results = await search_policy.acall(
+            lambda: loop.run_in_executor(_search_executor, _run_search, index, catalog, query, top_k)
+        )
+    except Exception as e:
+        logger.error(f"Error performing search: {str(e)}")
+        return []
+    return await loop.run_in_executor(_search_executor, _products_from_results, index, catalog, results)
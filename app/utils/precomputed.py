@@ -0,0 +1,198 @@
+import os
+import json
+import asyncio
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.indexing.manifest import METADATA_CHANGED, NEW, TEXT_CHANGED, ManifestDiff
+from app.utils.cache import ProcessLocalConnection, quiz_cache_key
+from app.utils.metrics import register_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PRECOMPUTED_PATH = os.getenv("PRECOMPUTED_PATH", "data/.precomputed_recommendations.sqlite3")
+# How long a server remembers that the table has not been built yet
+PRECOMPUTED_RECHECK_SECONDS = float(os.getenv("PRECOMPUTED_RECHECK_SECONDS", "30"))
+
+# Profile states. Outdated profiles are still served (every product they
+# list is unchanged) but new products may now rank higher, so the next
+# precompute run refreshes them. Invalid ones reference a changed or removed
+# product and are not served until recomputed.
+FRESH, OUTDATED, INVALID = 0, 1, 2
+
+class RecommendationTable:
+    """Finished recommendations keyed by normalized quiz, in a SQLite file.
+
+    Keys are the 32-byte quiz digest and payloads are zlib-compressed JSON,
+    so a few thousand profiles take a few megabytes. The product ids of each
+    profile are kept uncompressed so a re-index can find the profiles it
+    affects without decoding payloads.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS profiles (key BLOB PRIMARY KEY, quiz TEXT NOT NULL, "
+        "product_ids TEXT NOT NULL, payload BLOB NOT NULL, status INTEGER NOT NULL, "
+        "dirty_ids TEXT NOT NULL DEFAULT '', built_at REAL NOT NULL) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    )
+
+    def __init__(self, path: str = PRECOMPUTED_PATH, timeout: float = 5.0):
+        self.path = path
+        self._db = ProcessLocalConnection(path, timeout, self.SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        return self._db.get()
+
+    @staticmethod
+    def _key(quiz: str) -> bytes:
+        return bytes.fromhex(quiz_cache_key(quiz))
+
+    def get(self, quiz: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT payload FROM profiles WHERE key = ? AND status < ?", (self._key(quiz), INVALID)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, quiz: str, result: Dict[str, Any]):
+        payload = {
+            "summary_es": result["summary_es"],
+            "summary_en": result["summary_en"],
+            "products": result["products"],
+        }
+        blob = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+        product_ids = " ".join(product["id"] for product in result["products"])
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO profiles (key, quiz, product_ids, payload, status, dirty_ids, built_at) "
+                "VALUES (?, ?, ?, ?, ?, '', ?)",
+                (self._key(quiz), quiz, product_ids, blob, FRESH, time.time()),
+            )
+
+    def entries(self) -> Iterator[Tuple[bytes, str, int, List[str], Dict[str, Any]]]:
+        # (key, quiz, status, product ids whose explanations are stale, payload)
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT key, quiz, status, dirty_ids, payload FROM profiles"
+            ).fetchall()
+        for key, quiz, status, dirty_ids, payload in rows:
+            yield key, quiz, status, dirty_ids.split(), json.loads(zlib.decompress(payload))
+
+    def statuses(self) -> Dict[bytes, int]:
+        with self._lock:
+            return dict(self._connection().execute("SELECT key, status FROM profiles").fetchall())
+
+    def delete(self, keys: Iterable[bytes]):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            conn.executemany("DELETE FROM profiles WHERE key = ?", ((key,) for key in keys))
+            conn.execute("COMMIT")
+
+    def get_meta(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection().execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str):
+        with self._lock:
+            self._connection().execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def checkpoint(self):
+        # Fold the write-ahead log into the main file after a build
+        with self._lock:
+            self._connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def invalidate(self, rewritten: Iterable[str], metadata_changed: Iterable[str], added: bool) -> Dict[str, int]:
+        # Called after a re-index. Profiles listing a re-embedded, re-written
+        # or removed product lose those products' explanations; metadata-only
+        # changes (price, link) keep them but still stop the profile being
+        # served with stale fields. Any new product outdates the rest.
+        rewritten = set(rewritten)
+        metadata_changed = set(metadata_changed)
+        counts = {"invalid": 0, "outdated": 0}
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute("SELECT key, product_ids, status, dirty_ids FROM profiles").fetchall()
+            updates = []
+            for key, product_ids, status, dirty_ids in rows:
+                ids = set(product_ids.split())
+                dirty = ids & rewritten
+                if dirty or ids & metadata_changed:
+                    dirty_ids = " ".join(sorted(set(dirty_ids.split()) | dirty))
+                    updates.append((INVALID, dirty_ids, key))
+                    counts["invalid"] += 1
+                elif added and status == FRESH:
+                    updates.append((OUTDATED, dirty_ids, key))
+                    counts["outdated"] += 1
+            conn.execute("BEGIN")
+            conn.executemany("UPDATE profiles SET status = ?, dirty_ids = ? WHERE key = ?", updates)
+            conn.execute("COMMIT")
+        return counts
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses, "evictions": 0}
+
+_table: Optional[RecommendationTable] = None
+_table_lock = threading.Lock()
+_absent_until = 0.0
+
+def get_recommendation_table() -> Optional[RecommendationTable]:
+    # None until `run.py precompute` has written the file. A missing file is
+    # only looked for again after PRECOMPUTED_RECHECK_SECONDS, so requests
+    # skip the filesystem and a server started before the first build still
+    # picks the table up soon after it exists.
+    global _table, _absent_until
+    if _table is None:
+        if os.getenv("PRECOMPUTED_LOOKUP", "1").lower() in ("0", "false", "no") or time.monotonic() < _absent_until:
+            return None
+        if not os.path.exists(PRECOMPUTED_PATH):
+            _absent_until = time.monotonic() + PRECOMPUTED_RECHECK_SECONDS
+            return None
+        with _table_lock:
+            if _table is None:
+                # Lookups run on the event loop, so give up quickly if the
+                # precompute job holds a lock and serve from the graph instead
+                _table = RecommendationTable(PRECOMPUTED_PATH, float(os.getenv("PRECOMPUTED_READ_TIMEOUT", "0.05")))
+                register_cache("precomputed", _table)
+                logger.info(f"Serving precomputed recommendations from {PRECOMPUTED_PATH}")
+    return _table
+
+def _lookup(table: RecommendationTable, quiz: str) -> Optional[Dict[str, Any]]:
+    try:
+        return table.get(quiz)
+    except sqlite3.Error as e:
+        # A damaged or locked table must not fail the request
+        logger.warning(f"Precomputed lookup failed, running the graph: {str(e)}")
+        return None
+
+async def alookup_precomputed(quiz: str) -> Optional[Dict[str, Any]]:
+    # The read and decompression run in a worker thread; without a table
+    # there is nothing to read and the request stays on the event loop
+    table = get_recommendation_table()
+    return None if table is None else await asyncio.to_thread(_lookup, table, quiz)
+
+def invalidate_precomputed(diff: ManifestDiff) -> Optional[Dict[str, int]]:
+    # Apply an index run's changes to the table, if one has been built. A
+    # listed product coming back as new means a --full run rewrote it.
+    if not os.path.exists(PRECOMPUTED_PATH):
+        return None
+    rewritten = diff.ids[NEW] + diff.ids[TEXT_CHANGED] + diff.removed
+    return RecommendationTable(PRECOMPUTED_PATH).invalidate(
+        rewritten, diff.ids[METADATA_CHANGED], added=bool(diff.counts[NEW])
+    )
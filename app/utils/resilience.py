@@ -0,0 +1,365 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import httpx
+import openai
+from app.indexing.rate_limit import TokenBucket, call_with_backoff, error_status, is_retryable
+from app.utils.metrics import (
+    circuit_rejections, circuit_state, hedge_wins, hedged_requests, upstream_duration, upstream_errors,
+    upstream_retries,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Hedged sync calls run the original and the backup on these threads. The
+# request path hedges asynchronously (acall) and does not use this pool.
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("HEDGE_MAX_WORKERS", "32")),
+    thread_name_prefix="hedge",
+)
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+def is_transient(error: Exception) -> bool:
+    return is_retryable(error) or isinstance(error, (httpx.TransportError, openai.APIConnectionError))
+
+def trips_breaker(error: Exception) -> bool:
+    # A 429 is our own quota, which the rate limiter backs off from; only
+    # outages and server errors count against the upstream's health
+    return is_transient(error) and error_status(error) != 429
+
+class LatencyTracker:
+    """Rolling window of recent successful call latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class CircuitBreaker:
+    """Closed -> open after consecutive transient failures -> half-open.
+
+    While open every call is refused with ``CircuitOpenError``. After
+    ``reset_timeout`` one trial call is let through; its outcome closes
+    or re-opens the circuit.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: int):
+        if state != self.state:
+            logger.warning(f"Circuit for {self.name} is now {('closed', 'half-open', 'open')[state]}")
+        self.state = state
+        circuit_state.labels(self.name).set(state)
+
+    def allow(self) -> bool:
+        # True when this call is the half-open trial; the caller must then
+        # release_trial() however the call ends
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+        circuit_rejections.labels(self.name).inc()
+        raise CircuitOpenError(f"Circuit for {self.name} is open")
+
+    def retry_after(self) -> float:
+        # Seconds until an open circuit lets a trial call through
+        with self._lock:
+            if self.state == self.OPEN:
+                return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+            return 0.0
+
+    def release_trial(self):
+        # A cancelled trial, or one that failed for a reason that says nothing
+        # about the upstream's health, lets the next call try instead
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(upstream: str) -> CircuitBreaker:
+    # One breaker per upstream service, shared by all of its operations
+    with _breakers_lock:
+        breaker = _breakers.get(upstream)
+        if breaker is None:
+            prefix = upstream.upper()
+            breaker = CircuitBreaker(
+                upstream,
+                failure_threshold=int(os.getenv(f"{prefix}_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET", "30")),
+            )
+            _breakers[upstream] = breaker
+        return breaker
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+class UpstreamPolicy:
+    """Hedging, budgeted jittered retries and a circuit breaker for one call site.
+
+    Each attempt goes through the upstream's circuit breaker. If ``hedge`` is
+    on and the attempt has not answered after the ``hedge_quantile`` latency
+    of recent calls, a backup request is sent and the first success wins.
+    Transient failures are retried with full-jitter backoff until
+    ``max_retries`` or ``budget`` seconds are used up.
+    """
+
+    def __init__(
+        self,
+        upstream: str,
+        operation: str,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.05,
+        hedge_initial_delay: Optional[float] = None,
+        max_retries: int = 2,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+        budget: Optional[float] = None,
+    ):
+        self.upstream = upstream
+        self.operation = operation
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_initial_delay = hedge_initial_delay
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.breaker = get_circuit_breaker(upstream)
+        self.latency = LatencyTracker()
+
+    @classmethod
+    def from_env(cls, prefix: str, upstream: str, operation: str, **defaults) -> "UpstreamPolicy":
+        # <PREFIX>_HEDGE, _HEDGE_QUANTILE, _HEDGE_MIN_DELAY, _MAX_RETRIES, _RETRY_BUDGET override the defaults
+        settings = dict(defaults)
+        settings["hedge"] = _env_flag(f"{prefix}_HEDGE", defaults.get("hedge", False))
+        for key, env, cast in (("hedge_quantile", "HEDGE_QUANTILE", float), ("hedge_min_delay", "HEDGE_MIN_DELAY", float),
+                               ("max_retries", "MAX_RETRIES", int), ("budget", "RETRY_BUDGET", float)):
+            value = os.getenv(f"{prefix}_{env}")
+            if value is not None:
+                settings[key] = cast(value)
+        return cls(upstream, operation, **settings)
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        delay = self.latency.quantile(self.hedge_quantile)
+        if delay is None:
+            delay = self.hedge_initial_delay
+        return None if delay is None else max(self.hedge_min_delay, delay)
+
+    def _may_hedge(self) -> bool:
+        # A backup is one more call against the upstream, so it needs the
+        # breaker's permission like any other; never spend it on a trial
+        try:
+            trial = self.breaker.allow()
+        except CircuitOpenError:
+            return False
+        if trial:
+            self.breaker.release_trial()
+        return not trial
+
+    def _record(self, start: float, error: Optional[Exception] = None):
+        elapsed = time.perf_counter() - start
+        upstream_duration.labels(self.upstream, self.operation).observe(elapsed)
+        if error is None:
+            self.latency.observe(elapsed)
+            self.breaker.record_success()
+            return
+        upstream_errors.labels(self.upstream, self.operation).inc()
+        if trips_breaker(error):
+            self.breaker.record_failure()
+
+    def _retry_delay(self, attempt: int, started: float) -> Optional[float]:
+        # Full jitter; None once retries or the time budget are exhausted
+        if attempt >= self.max_retries:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if self.budget is not None and time.monotonic() - started + delay >= self.budget:
+            return None
+        return delay
+
+    # Async calls (LLM and request-path search)
+
+    async def _aattempt(self, func: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._record(start, e)
+            raise
+        self._record(start)
+        return result
+
+    async def _ahedged(self, func: Callable[[], Awaitable[T]]) -> T:
+        trial = self.breaker.allow()
+        try:
+            # A half-open trial is a single probe, never hedged
+            delay = None if trial else self.hedge_delay()
+            if delay is None:
+                return await self._aattempt(func)
+            return await self._ahedge_race(func, delay)
+        finally:
+            if trial:
+                self.breaker.release_trial()
+
+    async def _ahedge_race(self, func: Callable[[], Awaitable[T]], delay: float) -> T:
+        original = asyncio.ensure_future(self._aattempt(func))
+        pending = {original}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and self._may_hedge():
+                hedged_requests.labels(self.upstream, self.operation).inc()
+                pending.add(asyncio.ensure_future(self._aattempt(func)))
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not original:
+                            hedge_wins.labels(self.upstream, self.operation).inc()
+                        return task.result()
+                    error = error or task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def acall(self, func: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return await self._ahedged(func)
+            except Exception as e:
+                delay = self._retry_delay(attempt, started) if is_transient(e) else None
+                if delay is None:
+                    raise
+                attempt += 1
+                upstream_retries.labels(self.upstream, self.operation).inc()
+                logger.warning(f"Retrying {self.upstream} {self.operation} in {delay:.2f}s after error: {str(e)}")
+                await asyncio.sleep(delay)
+
+    # Sync calls (blocking search callers and indexer writes)
+
+    def _attempt(self, func: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            self._record(start, e)
+            raise
+        self._record(start)
+        return result
+
+    def _hedged(self, func: Callable[[], T]) -> T:
+        trial = self.breaker.allow()
+        try:
+            delay = None if trial else self.hedge_delay()
+            if delay is None:
+                return self._attempt(func)
+            return self._hedge_race(func, delay)
+        finally:
+            if trial:
+                self.breaker.release_trial()
+
+    def _hedge_race(self, func: Callable[[], T], delay: float) -> T:
+        original = _hedge_executor.submit(self._attempt, func)
+        done, pending = wait([original], timeout=delay)
+        if not done and self._may_hedge():
+            hedged_requests.labels(self.upstream, self.operation).inc()
+            pending.add(_hedge_executor.submit(self._attempt, func))
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    if future is not original:
+                        hedge_wins.labels(self.upstream, self.operation).inc()
+                    # The slower request finishes on its own; its result is dropped
+                    return future.result()
+                error = error or future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def _admitted(self, func: Callable[[], T], started: float) -> T:
+        # Wait out an open circuit while the retry budget allows instead of
+        # failing outright; a budget too short for the reset still fails fast
+        while True:
+            try:
+                return self._hedged(func)
+            except CircuitOpenError:
+                retry_in = max(0.05, self.breaker.retry_after()) * random.uniform(1.0, 1.5)
+                if self.budget is None or time.monotonic() - started + retry_in >= self.budget:
+                    raise
+                time.sleep(retry_in)
+
+    def call(self, func: Callable[[], T], limiter: Optional[TokenBucket] = None,
+             on_retry: Optional[Callable[[int, Exception, float], None]] = None) -> T:
+        def count_retry(attempt: int, error: Exception, delay: float):
+            upstream_retries.labels(self.upstream, self.operation).inc()
+            if on_retry is not None:
+                on_retry(attempt, error, delay)
+
+        started = time.monotonic()
+        return call_with_backoff(
+            lambda: self._admitted(func, started), limiter=limiter, max_retries=self.max_retries, base_delay=self.base_delay,
+            max_delay=self.max_delay, on_retry=count_retry, budget=self.budget, retryable=is_transient,
+        )
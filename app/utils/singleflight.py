@@ -0,0 +1,68 @@
+import time
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from app.utils.metrics import Counter, registry
+
+coalesced_executions = registry.register(Counter(
+    "pet_quiz_coalesced_executions_total",
+    "Executions saved by joining an identical in-flight request", ["operation"]))
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight execution.
+
+    The first caller starts the work; callers arriving before it finishes
+    await the same task and get the same result or exception. Nothing is
+    kept once the task is done, so this only collapses bursts; repeated
+    requests over time are handled by the caches.
+
+    With a ``budget`` (seconds the work may take) a caller only joins an
+    execution that was given at least as much time and that will finish
+    before the caller's own deadline, so a short-deadline request never
+    cuts the budget of the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # Per key: (task, budget, deadline) of each in-flight execution
+        self._calls: Dict[Hashable, List[tuple]] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.saved = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]], budget: Optional[float] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        deadline = None if budget is None else time.monotonic() + budget
+        with self._lock:
+            task = next((call[0] for call in self._calls.get(key, ())
+                         if call[0].get_loop() is loop and _covers(call, budget, deadline)), None)
+            if task is not None:
+                self.saved += 1
+                coalesced_executions.labels(self.name).inc()
+            else:
+                task = asyncio.ensure_future(func())
+                self._calls.setdefault(key, []).append((task, budget, deadline))
+                self.executions += 1
+                task.add_done_callback(lambda done: self._finish(key, done))
+        # Shielded so one caller disconnecting does not cancel the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        with self._lock:
+            calls = [call for call in self._calls.get(key, ()) if call[0] is not task]
+            if calls:
+                self._calls[key] = calls
+            else:
+                self._calls.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            task.exception()
+
+    def __len__(self) -> int:
+        return sum(len(calls) for calls in self._calls.values())
+
+def _covers(call: tuple, budget: Optional[float], deadline: Optional[float]) -> bool:
+    _, running_budget, running_deadline = call
+    if running_budget is None:
+        return budget is None
+    return budget is not None and running_budget >= budget and running_deadline <= deadline
@@ -0,0 +1,91 @@
+"""Profiles/minute of the batch endpoint vs looping the single endpoint.
+
+Uses the sleeping in-process fakes from benchmarks.concurrent_recommend
+and a sample of quizzes drawn from a small answer space, so duplicates
+occur the way they do in saved partner profiles. Caches are cleared
+before each run.
+
+Usage: python -m benchmarks.batch_throughput --quizzes 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+
+from app.api import main as api_main
+from app.api import recommendation_agent
+from benchmarks.concurrent_recommend import install_fakes
+
+QUESTIONS = {
+    "¿Qué tipo de mascota tienes?": ["Perro", "Gato"],
+    "¿De qué tamaño es tu mascota?": ["Pequeño", "Mediano", "Grande"],
+    "¿Cuál es la edad de tu mascota?": ["Cachorro", "Adulto", "Senior"],
+    "¿Tu mascota es muy activa?": ["Sí, muy activa", "Moderadamente", "Poco activa"],
+}
+
+
+def sample_quizzes(count: int, seed: int = 11) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        "\n".join(f"{question}: {rng.choice(options)}" for question, options in QUESTIONS.items())
+        for _ in range(count)
+    ]
+
+
+def clear_caches():
+    recommendation_agent.summary_cache.clear()
+    recommendation_agent.explanation_cache.clear()
+
+
+async def run(quizzes: List[str], concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=api_main.app)
+    async with api_main.app.router.lifespan_context(api_main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            clear_caches()
+            start = time.perf_counter()
+            for quiz in quizzes:
+                response = await client.post("/api/recommend", json={"formatted_quiz": quiz})
+                response.raise_for_status()
+            loop_seconds = time.perf_counter() - start
+
+            clear_caches()
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/recommend/batch", json={"quizzes": quizzes, "max_concurrency": concurrency}
+            )
+            response.raise_for_status()
+            results = [json.loads(line) for line in response.text.splitlines() if line]
+            batch_seconds = time.perf_counter() - start
+
+    if sorted(result["index"] for result in results) != list(range(len(quizzes))):
+        raise RuntimeError("Batch endpoint did not return one result per quiz")
+    return {
+        "quizzes": len(quizzes),
+        "unique_profiles": len(set(quizzes)),
+        "loop_profiles_per_minute": round(len(quizzes) / loop_seconds * 60, 1),
+        "batch_profiles_per_minute": round(len(quizzes) / batch_seconds * 60, 1),
+        "speedup": round(loop_seconds / batch_seconds, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quizzes", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--search-latency", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    install_fakes(args.llm_latency, args.search_latency)
+    report = asyncio.run(run(sample_quizzes(args.quizzes), args.concurrency))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Check that one worker serves concurrent recommendations in parallel.
+
+Replaces the OpenAI models and the Pinecone search with the fakes from
+tests.fakes, which sleep for a fixed latency, then compares one request against N
+concurrent requests sent through the ASGI app. With a non-blocking
+pipeline both take roughly the same wall time.
+
+Usage: python -m benchmarks.concurrent_recommend --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.api import main as api_main
+from app.api import recommendation_agent
+from tests.fakes import SleepyChatModel, make_fake_search
+
+
+def install_fakes(llm_latency: float, search_latency: float):
+    model = SleepyChatModel(latency=llm_latency)
+    recommendation_agent.get_chat_model = lambda *args, **kwargs: model
+    recommendation_agent.asearch_products = make_fake_search(search_latency)
+    api_main.warm_up = lambda: 0.0
+    recommendation_agent.reset_pet_recommendation_graph()
+
+
+async def timed_requests(client: httpx.AsyncClient, count: int) -> float:
+    # A distinct quiz per request keeps the summary and explanation caches cold
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[
+        client.post("/api/recommend", json={"formatted_quiz": f"¿Qué tipo de mascota tienes?: Perro {uuid.uuid4()}"})
+        for _ in range(count)
+    ])
+    elapsed = time.perf_counter() - start
+    failed = [r.status_code for r in responses if r.status_code != 200]
+    if failed:
+        raise RuntimeError(f"{len(failed)} requests failed: {failed[:5]}")
+    return elapsed
+
+
+async def run(concurrency: int, llm_latency: float, search_latency: float) -> dict:
+    install_fakes(llm_latency, search_latency)
+    transport = httpx.ASGITransport(app=api_main.app)
+    async with api_main.app.router.lifespan_context(api_main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            await timed_requests(client, 1)  # warm-up
+            single = await timed_requests(client, 1)
+            concurrent = await timed_requests(client, concurrency)
+    return {
+        "concurrency": concurrency,
+        "single_s": round(single, 3),
+        "concurrent_s": round(concurrent, 3),
+        "ratio": round(concurrent / single, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--search-latency", type=float, default=0.2)
+    parser.add_argument("--max-ratio", type=float, default=1.5,
+                        help="Fail if N concurrent requests take longer than this multiple of one request")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args.concurrency, args.llm_latency, args.search_latency))
+    print(json.dumps(report, indent=2))
+    if report["ratio"] > args.max_ratio:
+        print(f"FAIL: {args.concurrency} concurrent requests took {report['ratio']}x a single request")
+        return 1
+    print("OK: concurrent requests completed in about the time of one")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
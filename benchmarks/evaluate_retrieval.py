@@ -0,0 +1,106 @@
+"""Offline recall@k and latency report for the retrieval backends.
+
+Queries default to the distinct ``search_query`` values of the catalog,
+with every product collected for that query counted as relevant. A
+JSONL file of {"query": ..., "relevant": [ids]} can be passed instead.
+Recall is capped at k: hits / min(k, |relevant|).
+
+Usage: python -m benchmarks.evaluate_retrieval --backends pinecone,hybrid --k 5
+       python -m benchmarks.evaluate_retrieval --vector-backend local   # fully offline
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+from app.retrieval.backends import create_retrieval_backend
+from app.retrieval.hybrid_backend import HybridBackend
+from app.retrieval.local_backend import LocalBM25Backend, catalog_paths, load_catalog
+
+
+def load_queries(path: Optional[str]) -> List[Dict]:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    df = load_catalog(catalog_paths())
+    df = df[df["search_query"].notna()]
+    return [
+        {"query": query, "relevant": list(group["id"])}
+        for query, group in df.groupby("search_query")
+    ]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def evaluate(backend, queries: List[Dict], k: int) -> Dict:
+    recalls, latencies, fusion = [], [], []
+    for item in queries:
+        start = time.perf_counter()
+        results = backend.search(item["query"], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if isinstance(backend, HybridBackend):
+            fusion.append(backend.last_fusion_seconds * 1000)
+        relevant = set(item["relevant"])
+        hits = sum(1 for product in results if product["id"] in relevant)
+        recalls.append(hits / min(k, len(relevant)) if relevant else 0.0)
+
+    report = {
+        "backend": backend.name,
+        "queries": len(queries),
+        f"recall@{k}": round(statistics.mean(recalls), 4),
+        "latency_ms_p50": round(percentile(latencies, 50), 3),
+        "latency_ms_p95": round(percentile(latencies, 95), 3),
+    }
+    if fusion:
+        report["fusion_ms_p50"] = round(percentile(fusion, 50), 3)
+        report["fusion_ms_p95"] = round(percentile(fusion, 95), 3)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="vector,hybrid",
+                        help="Comma-separated list of: vector, hybrid, local")
+    parser.add_argument("--vector-backend", default="pinecone",
+                        help="Engine used for the vector stage (pinecone, or local for an offline dry run)")
+    parser.add_argument("--queries", help="JSONL file with query and relevant ids")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--lexical-candidates", type=int, default=20)
+    parser.add_argument("--vector-weight", type=float, default=1.0)
+    parser.add_argument("--lexical-weight", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    queries = load_queries(args.queries)
+    lexical = LocalBM25Backend()
+    vector = lexical if args.vector_backend == "local" else create_retrieval_backend(args.vector_backend)
+    backends = {
+        "vector": vector,
+        "local": lexical,
+        "hybrid": HybridBackend(
+            vector,
+            lexical_backend=lexical,
+            candidate_k=args.candidates,
+            lexical_k=args.lexical_candidates,
+            vector_weight=args.vector_weight,
+            lexical_weight=args.lexical_weight,
+        ),
+    }
+
+    reports = [evaluate(backends[name.strip()], queries, args.k) for name in args.backends.split(",")]
+    by_name = {report["backend"]: report for report in reports}
+    if "hybrid" in by_name and vector.name in by_name and vector.name != "local":
+        by_name["hybrid"]["added_latency_ms_p50"] = round(
+            by_name["hybrid"]["latency_ms_p50"] - by_name[vector.name]["latency_ms_p50"], 3
+        )
+    print(json.dumps(reports, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
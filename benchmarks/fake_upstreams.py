@@ -0,0 +1,297 @@
+"""Local stand-ins for the OpenAI and Pinecone HTTP APIs.
+
+Serves just enough of each API for the app and the indexer:
+
+- OpenAI: ``POST /v1/chat/completions`` (plain and ``stream: true``)
+- Pinecone data plane: ``records/namespaces/<ns>/search``,
+  ``records/namespaces/<ns>/upsert``, ``vectors/upsert``,
+  ``vectors/fetch``, ``vectors/update``, ``vectors/delete``, ``describe_index_stats``
+- Pinecone inference: ``POST /embed``
+
+Every request sleeps for a latency drawn from a configurable distribution
+and fails with a configurable probability. ``GET /stats`` returns request
+and injected error counts per route.
+
+Latency specs: ``fixed:0.1``, ``uniform:0.05,0.2``, ``normal:0.2,0.05``,
+``lognormal:0.2,0.5`` (median seconds, sigma). All values are seconds.
+
+Usage: python -m benchmarks.fake_upstreams --openai-port 8101 --pinecone-port 8102 \\
+           --openai-latency lognormal:0.4,0.4 --pinecone-latency lognormal:0.05,0.3 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+WORDS = ("durable rubber ball chew toy rope plush squeaky fetch interactive puzzle treat "
+         "dispenser large small puppy senior dog cat scratcher bed harness leash").split()
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    kind, _, args = spec.partition(":")
+    params = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(params[0]), params[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class FaultProfile:
+    """Latency distribution and error injection shared by one fake server."""
+
+    def __init__(self, latency: str = "fixed:0", error_rate: float = 0.0,
+                 error_statuses: Sequence[int] = (429, 503), seed: int = 7):
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_statuses = list(error_statuses)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def draw(self, route: str) -> Tuple[float, Optional[int]]:
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            delay = self.sample_latency(self._rng)
+            status = None
+            if self._rng.random() < self.error_rate:
+                status = self._rng.choice(self.error_statuses)
+                self.errors[route] = self.errors.get(route, 0) + 1
+            return delay, status
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {"requests": dict(self.requests), "errors": dict(self.errors)}
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    profile: FaultProfile
+    routes: Dict[str, Callable[["FakeHandler", bytes], Tuple[int, object]]]
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: object, content_type: str = "application/json"):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/stats":
+            self._send(200, self.profile.stats())
+            return
+        route = next((name for name in self.routes if re.fullmatch(name, path)), None)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if route is None:
+            self._send(404, {"error": {"message": f"No fake route for {path}"}})
+            return
+        delay, error_status = self.profile.draw(route)
+        time.sleep(delay)
+        if error_status is not None:
+            self._send(error_status, {"error": {"message": "Injected failure", "code": error_status}})
+            return
+        status, response = self.routes[route](self, body)
+        if isinstance(response, tuple):
+            # (content type, raw bytes) for non-JSON responses
+            self._send(status, response[1], response[0])
+        else:
+            self._send(status, response)
+
+    do_GET = _dispatch
+    do_POST = _dispatch
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+
+def _chat_content(messages: List[Dict[str, str]]) -> str:
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    if "Productos:" in prompt:
+        ids = re.findall(r'"id": "([^"]+)"', prompt)
+        return json.dumps([
+            {"id": i, "explanation_es": "Ideal para tu mascota.", "explanation_en": "Great for your pet."}
+            for i in ids
+        ])
+    digest = _digest(prompt)
+    return json.dumps({"summary_es": f"Juguete resistente para perro grande {digest}",
+                       "summary_en": f"Durable toy for a large dog {digest}"})
+
+
+def chat_completions(handler: FakeHandler, body: bytes):
+    request = json.loads(body or b"{}")
+    content = _chat_content(request.get("messages", []))
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content.split()),
+             "total_tokens": prompt_tokens + len(content.split())}
+    created = int(time.time())
+    model = request.get("model", "gpt-4o-mini")
+    if request.get("stream"):
+        events = []
+        for i in range(0, len(content), 16):
+            events.append({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                           "choices": [{"index": 0, "delta": {"content": content[i:i + 16]}, "finish_reason": None}]})
+        events.append({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if request.get("stream_options", {}).get("include_usage"):
+            events.append({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                           "model": model, "choices": [], "usage": usage})
+        stream = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        return 200, ("text/event-stream", stream.encode("utf-8"))
+    return 200, {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+# Ids returned by search; set from the real catalog so the app can hydrate hits
+PRODUCT_IDS: List[str] = []
+
+
+def use_product_ids(ids: Sequence[str]):
+    PRODUCT_IDS[:] = list(ids)
+
+
+def _product_fields(product_id: str) -> Dict[str, object]:
+    # Deterministic per id, with a description about as long as the catalog's
+    rng = random.Random(product_id)
+    words = " ".join(rng.choices(WORDS, k=250))
+    return {
+        "name": words[:40],
+        "price": round(rng.uniform(5, 80), 2),
+        "image_url": f"https://example.com/img/{product_id}.jpg",
+        "product_link": f"https://example.com/p/{product_id}",
+        "search_query": words[:20],
+        "text": f"Title: {words}",
+    }
+
+
+def search_records(handler: FakeHandler, body: bytes):
+    request = json.loads(body or b"{}")
+    query = request.get("query", {})
+    text = query.get("inputs", {}).get("text", "")
+    top_k = int(query.get("top_k", 5))
+    requested = request.get("fields")
+    rng = random.Random(text)
+    hits = []
+    for rank in range(top_k):
+        product_id = rng.choice(PRODUCT_IDS) if PRODUCT_IDS else f"FAKE{rng.randrange(100000):06d}"
+        fields = _product_fields(product_id)
+        if requested is not None and "*" not in requested:
+            fields = {name: value for name, value in fields.items() if name in requested}
+        hits.append({"_id": product_id, "_score": round(1.0 - rank * 0.05, 4), "fields": fields})
+    return 200, {"result": {"hits": hits}, "usage": {"read_units": 1, "embed_total_tokens": len(text.split())}}
+
+
+def fetch_vectors(handler: FakeHandler, body: bytes):
+    ids = parse_qs(urlsplit(handler.path).query).get("ids", [])
+    return 200, {
+        "namespace": "",
+        "vectors": {product_id: {"id": product_id, "values": [0.0], "metadata": _product_fields(product_id)}
+                    for product_id in ids},
+        "usage": {"readUnits": 1},
+    }
+
+
+def upsert_records(handler: FakeHandler, body: bytes):
+    return 201, ("application/json", b"")
+
+
+def upsert_vectors(handler: FakeHandler, body: bytes):
+    request = json.loads(body or b"{}")
+    return 200, {"upsertedCount": len(request.get("vectors", []))}
+
+
+def empty_response(handler: FakeHandler, body: bytes):
+    return 200, {}
+
+
+def describe_index_stats(handler: FakeHandler, body: bytes):
+    return 200, {"namespaces": {}, "dimension": 1024, "indexFullness": 0.0, "totalVectorCount": 0}
+
+
+def embed(handler: FakeHandler, body: bytes):
+    request = json.loads(body or b"{}")
+    embeddings = []
+    for text in request.get("texts", []):
+        rng = random.Random(text)
+        embeddings.append([round(rng.uniform(-1, 1), 5) for _ in range(1024)])
+    return 200, {"embeddings": embeddings}
+
+
+OPENAI_ROUTES = {
+    r"/(v1/)?chat/completions": chat_completions,
+}
+
+PINECONE_ROUTES = {
+    r"/records/namespaces/[^/]*/search": search_records,
+    r"/records/namespaces/[^/]*/upsert": upsert_records,
+    r"/vectors/upsert": upsert_vectors,
+    r"/vectors/fetch": fetch_vectors,
+    r"/vectors/update": empty_response,
+    r"/vectors/delete": empty_response,
+    r"/describe_index_stats": describe_index_stats,
+    r"/embed": embed,
+}
+
+
+def start_server(routes, profile: FaultProfile, port: int = 0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    handler = type("Handler", (FakeHandler,), {"routes": routes, "profile": profile})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openai-port", type=int, default=8101)
+    parser.add_argument("--pinecone-port", type=int, default=8102)
+    parser.add_argument("--openai-latency", default="lognormal:0.4,0.4")
+    parser.add_argument("--pinecone-latency", default="lognormal:0.05,0.3")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="429,503")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    statuses = [int(status) for status in args.error_statuses.split(",")]
+    openai = start_server(OPENAI_ROUTES, FaultProfile(args.openai_latency, args.error_rate, statuses, args.seed),
+                          args.openai_port, args.host)
+    pinecone = start_server(PINECONE_ROUTES, FaultProfile(args.pinecone_latency, args.error_rate, statuses,
+                                                          args.seed + 1), args.pinecone_port, args.host)
+    print(json.dumps({"openai": f"http://{args.host}:{openai.server_address[1]}/v1",
+                      "pinecone": f"http://{args.host}:{pinecone.server_address[1]}"}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Critical-path latency of the linear vs parallel recommendation graph.
+
+Uses the sleeping in-process fakes from benchmarks.concurrent_recommend.
+In parallel mode the search runs while the summary is generated, so each
+request should be about one search latency faster; with a real search
+backend that is usually the retrieval round trip plus embedding.
+
+Usage: python -m benchmarks.graph_modes --requests 20 --llm-latency 0.5 --search-latency 0.3
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+from app.api import recommendation_agent
+from benchmarks.concurrent_recommend import install_fakes
+
+
+async def run(mode: str, requests: int) -> dict:
+    graph = recommendation_agent.create_pet_recommendation_graph(mode)
+    latencies = []
+    for _ in range(requests):
+        # A distinct quiz per request keeps the caches cold
+        quiz = f"¿Qué tipo de mascota tienes?: Perro\n¿De qué tamaño es tu mascota?: Grande {uuid.uuid4()}"
+        start = time.perf_counter()
+        result = await graph.ainvoke({"quiz_data": quiz})
+        latencies.append(time.perf_counter() - start)
+        if len(result["products"]) != recommendation_agent.RECOMMENDATION_TOP_K:
+            raise RuntimeError(f"{mode} graph returned {len(result['products'])} products")
+    return {
+        "mode": mode,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    args = parser.parse_args(argv)
+
+    install_fakes(args.llm_latency, args.search_latency)
+    reports = [asyncio.run(run(mode, args.requests)) for mode in ("linear", "parallel")]
+    print(json.dumps({
+        "llm_latency_s": args.llm_latency,
+        "search_latency_s": args.search_latency,
+        "modes": reports,
+        "saved_ms": round(reports[0]["mean_ms"] - reports[1]["mean_ms"], 1),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
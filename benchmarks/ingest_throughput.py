@@ -0,0 +1,137 @@
+"""Rows/sec and peak RSS of catalog ingestion on a synthetic catalog.
+
+Writes a synthetic CSV with the catalog's columns, then runs each
+ingestion mode in its own subprocess so peak RSS is measured in
+isolation:
+
+- streaming: chunked read -> validate -> build records -> batches (the indexer pipeline)
+- legacy: full pd.read_csv + iterrows, as the indexer used to do
+
+Usage: python -m benchmarks.ingest_throughput --rows 1000000 --modes streaming,legacy
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+WORDS = ("perro gato juguete pelota cuerda resistente masticable grande pequeño cachorro interactivo "
+         "durable rubber ball fetch chew toy large small puppy squeaky plush rope lbs 20-60 60-100").split()
+
+
+def write_catalog(path: str, rows: int, seed: int = 7):
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "image_url", "price", "product_link", "description_keywords", "search_query"])
+        for i in range(rows):
+            words = rng.choices(WORDS, k=30)
+            writer.writerow([
+                f"SYN{i:09d}",
+                " ".join(words[:8]),
+                f"https://example.com/img/{i}.jpg",
+                round(rng.uniform(1, 500), 2),
+                f"https://example.com/p/{i}",
+                "Title: " + " ".join(words),
+                " ".join(words[:4]),
+            ])
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_streaming(path: str, batch_size: int, chunksize: int) -> int:
+    from app.indexing.ingest import batched, iter_catalog_records
+
+    stats = {}
+    records = 0
+    for batch in batched(iter_catalog_records([path], stats, chunksize), batch_size):
+        records += len(batch)
+    return records
+
+
+def run_legacy(path: str, batch_size: int, chunksize: int) -> int:
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    records = 0
+    for i in range(0, len(df), batch_size):
+        for _, row in df.iloc[i:i + batch_size].iterrows():
+            if pd.isna(row["description_keywords"]):
+                continue
+            {
+                "_id": row["id"],
+                "text": row["description_keywords"],
+                "name": row["name"],
+                "price": row["price"] if not pd.isna(row["price"]) else 0.0,
+                "image_url": row["image_url"],
+                "product_link": row["product_link"],
+                "search_query": row["search_query"] if not pd.isna(row["search_query"]) else "",
+            }
+            records += 1
+    return records
+
+
+MODES = {"streaming": run_streaming, "legacy": run_legacy}
+
+
+def measure(mode: str, path: str, batch_size: int, chunksize: int) -> dict:
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    records = MODES[mode](path, batch_size, chunksize)
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "records": records,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(records / elapsed, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "baseline_rss_mb": round(baseline, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--modes", default="streaming,legacy")
+    parser.add_argument("--batch-size", type=int, default=96)
+    parser.add_argument("--chunksize", type=int, default=2000)
+    parser.add_argument("--csv", help="Use an existing CSV instead of generating one")
+    parser.add_argument("--measure", choices=sorted(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.csv, args.batch_size, args.chunksize)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if not path:
+            path = os.path.join(tmp, "synthetic_catalog.csv")
+            start = time.perf_counter()
+            write_catalog(path, args.rows)
+            print(f"Wrote {args.rows} synthetic rows ({os.path.getsize(path) / 2**20:.0f} MiB) "
+                  f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        reports = []
+        for mode in args.modes.split(","):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.ingest_throughput", "--measure", mode, "--csv", path,
+                 "--batch-size", str(args.batch_size), "--chunksize", str(args.chunksize)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            reports.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(reports, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
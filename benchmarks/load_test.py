@@ -0,0 +1,274 @@
+"""Offline load test of /api/recommend and the indexer against fake upstreams.
+
+Starts the local OpenAI/Pinecone stand-ins from benchmarks.fake_upstreams,
+runs the real app under uvicorn pointed at them, and drives
+``/api/recommend`` at increasing concurrency. Per-stage timings come from
+the ``Server-Timing`` header. The indexer is then run against the same
+fake Pinecone with an increasing number of workers.
+
+The report is written as sorted, indented JSON so two runs can be diffed:
+
+    python -m benchmarks.load_test --output before.json
+    git checkout other-branch
+    python -m benchmarks.load_test --output after.json
+    diff before.json after.json
+
+Usage: python -m benchmarks.load_test --concurrency 1,8,32,128 --requests 200 \\
+           --openai-latency lognormal:0.4,0.4 --pinecone-latency lognormal:0.05,0.3 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# The indexer invalidates the precomputed table after a run; point it (and
+# the app) at a path that is never built so the synthetic rows cannot touch
+# a real table
+os.environ["PRECOMPUTED_PATH"] = os.path.join(tempfile.mkdtemp(prefix="load-test-"), "precomputed.sqlite3")
+
+import httpx
+
+from benchmarks.batch_throughput import sample_quizzes
+from app.retrieval.local_backend import catalog_paths, load_catalog
+from benchmarks.fake_upstreams import OPENAI_ROUTES, PINECONE_ROUTES, FaultProfile, start_server, use_product_ids
+from benchmarks.ingest_throughput import write_catalog
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "p50": round(rank(0.50) * 1000, 1),
+        "p95": round(rank(0.95) * 1000, 1),
+        "p99": round(rank(0.99) * 1000, 1),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 1),
+        "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    timings = {}
+    for part in header.split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        if duration:
+            timings[name] = float(duration) / 1000
+    return timings
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.api.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("App exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not start within 30s")
+
+
+async def drive_recommend(base_url: str, quizzes: List[str], concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def one(quiz: str):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/api/recommend", json={"formatted_quiz": quiz},
+                                                 headers={"X-Timing-Breakdown": "1"})
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    return
+                elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                return
+            latencies.append(elapsed)
+            for name, seconds in parse_server_timing(response.headers.get("server-timing", "")).items():
+                stages.setdefault(name, []).append(seconds)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(quiz) for quiz in quizzes))
+        wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(quizzes),
+        "succeeded": len(latencies),
+        "errors": errors,
+        "seconds": round(wall, 2),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {name: percentiles(values) for name, values in sorted(stages.items())},
+    }
+
+
+def _upstream_totals() -> Dict[str, Dict[str, float]]:
+    from app.utils.metrics import upstream_duration, upstream_retries
+
+    totals = {}
+    for (upstream, operation), child in list(upstream_duration._children.items()):
+        totals[f"{upstream}.{operation}"] = {"calls": sum(child.counts), "seconds": child.sum, "retries": 0.0}
+    for (upstream, operation), child in list(upstream_retries._children.items()):
+        totals.setdefault(f"{upstream}.{operation}", {"calls": 0, "seconds": 0.0, "retries": 0.0})
+        totals[f"{upstream}.{operation}"]["retries"] = child.value
+    return totals
+
+
+def drive_indexer(pinecone_url: str, csv_path: str, workers: int, batch_size: int, rate: float,
+                  upsert_mode: str) -> dict:
+    from app.indexing.pinecone_indexer import PineconeIndexer
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        # Fresh manifest and embedding cache so every record is written
+        os.environ["INDEX_MANIFEST_PATH"] = os.path.join(state_dir, "manifest.json")
+        os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(state_dir, "embeddings")
+        indexer = PineconeIndexer(batch_size=batch_size, max_workers=workers, requests_per_second=rate,
+                                  use_vectors=upsert_mode == "vectors")
+        indexer.index = indexer.pc.Index(host=pinecone_url, pool_threads=workers)
+        before = _upstream_totals()
+        start = time.perf_counter()
+        # The indexer prints progress; keep stdout for the report
+        with contextlib.redirect_stdout(sys.stderr):
+            diff = indexer.index_products([csv_path], full=True)
+        wall = time.perf_counter() - start
+        after = _upstream_totals()
+
+    records = diff.counts["new"]
+    operations = {}
+    for name, total in sorted(after.items()):
+        previous = before.get(name, {"calls": 0, "seconds": 0.0, "retries": 0.0})
+        calls = total["calls"] - previous["calls"]
+        if not calls:
+            continue
+        operations[name] = {
+            "calls": calls,
+            "mean_ms": round((total["seconds"] - previous["seconds"]) / calls * 1000, 1),
+            "retries": int(total["retries"] - previous["retries"]),
+        }
+    return {
+        "workers": workers,
+        "records": records,
+        "seconds": round(wall, 2),
+        "records_per_second": round(records / wall, 1),
+        "upstream": operations,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma-separated /api/recommend concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--openai-latency", default="lognormal:0.4,0.4")
+    parser.add_argument("--pinecone-latency", default="lognormal:0.05,0.3")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="429,503")
+    parser.add_argument("--index-workers", default="1,4,16", help="Comma-separated indexer worker counts; empty to skip")
+    parser.add_argument("--index-rows", type=int, default=2000)
+    parser.add_argument("--index-batch-size", type=int, default=20)
+    parser.add_argument("--index-rate", type=float, default=1000.0, help="Indexer requests/second limit")
+    parser.add_argument("--upsert-mode", choices=["records", "vectors"], default="records")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    statuses = [int(status) for status in args.error_statuses.split(",")]
+    # Search hits use real catalog ids so the app can hydrate them locally
+    use_product_ids(load_catalog(catalog_paths())["id"].astype(str).tolist())
+    openai = start_server(OPENAI_ROUTES, FaultProfile(args.openai_latency, args.error_rate, statuses, args.seed))
+    pinecone = start_server(PINECONE_ROUTES, FaultProfile(args.pinecone_latency, args.error_rate, statuses,
+                                                          args.seed + 1))
+    openai_url = f"http://127.0.0.1:{openai.server_address[1]}/v1"
+    pinecone_url = f"http://127.0.0.1:{pinecone.server_address[1]}"
+    env = {
+        "OPENAI_API_KEY": "load-test",
+        "OPENAI_BASE_URL": openai_url,
+        "PINECONE_API_KEY": "load-test",
+        "PINECONE_INDEX_HOST": pinecone_url,
+        "PINECONE_EMBED_URL": f"{pinecone_url}/embed",
+        "RETRIEVAL_BACKEND": "pinecone",
+    }
+    os.environ.update(env)
+
+    report = {
+        "config": {
+            "openai_latency": args.openai_latency,
+            "pinecone_latency": args.pinecone_latency,
+            "error_rate": args.error_rate,
+            "error_statuses": statuses,
+            "requests_per_level": args.requests,
+            "index_rows": args.index_rows,
+            "upsert_mode": args.upsert_mode,
+        },
+        "recommend": [],
+        "indexer": [],
+    }
+
+    port = free_port()
+    app = start_app(port, env)
+    try:
+        for level, concurrency in enumerate(int(c) for c in args.concurrency.split(",")):
+            # A nonce per request keeps the summary and explanation caches cold
+            quizzes = [f"{quiz}\nPedido: {level}-{i}"
+                       for i, quiz in enumerate(sample_quizzes(args.requests, seed=args.seed + level))]
+            result = asyncio.run(drive_recommend(f"http://127.0.0.1:{port}", quizzes, concurrency))
+            print(f"recommend concurrency={concurrency}: {result['throughput_rps']} req/s, "
+                  f"p95 {result['latency_ms'].get('p95')} ms", file=sys.stderr)
+            report["recommend"].append(result)
+    finally:
+        app.terminate()
+        app.wait(timeout=10)
+
+    if args.index_workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "catalog.csv")
+            write_catalog(csv_path, args.index_rows, seed=args.seed)
+            for workers in (int(w) for w in args.index_workers.split(",")):
+                result = drive_indexer(pinecone_url, csv_path, workers, args.index_batch_size, args.index_rate,
+                                       args.upsert_mode)
+                print(f"indexer workers={workers}: {result['records_per_second']} records/s", file=sys.stderr)
+                report["indexer"].append(result)
+
+    report["upstream_requests"] = {"openai": openai.RequestHandlerClass.profile.stats(),
+                                   "pinecone": pinecone.RequestHandlerClass.profile.stats()}
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Latency of precomputed vs computed recommendations, and incremental rebuilds.
+
+Builds the precomputed table for the quiz answer space (data/quiz_space.json)
+with the sleeping in-process fakes from benchmarks.concurrent_recommend,
+then times ``/api/recommend`` for covered profiles with the lookup on and
+off. With the lookup on a request is one SQLite point read, so it no longer
+depends on the LLM or search latency.
+
+It then applies a simulated re-index (one product re-worded, one added)
+and rebuilds incrementally. Stored summaries and unchanged explanations
+are reused, so the rebuild makes far fewer LLM calls than the first build.
+
+Usage: python -m benchmarks.precomputed_lookup --requests 50 --llm-latency 0.2 --search-latency 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+os.environ.setdefault("PRECOMPUTED_PATH", os.path.join(tempfile.gettempdir(), "precomputed_benchmark.sqlite3"))
+
+import httpx
+
+from app.api import main as api_main
+from app.api import precompute, recommendation_agent
+from app.indexing.manifest import NEW, TEXT_CHANGED, ManifestDiff
+from app.utils import precomputed
+from benchmarks.batch_throughput import clear_caches
+from benchmarks.concurrent_recommend import install_fakes
+from tests.fakes import SleepyChatModel
+
+llm_calls = {"count": 0}
+
+
+def count_llm_calls():
+    respond = SleepyChatModel._respond
+
+    def counting(self, messages):
+        llm_calls["count"] += 1
+        return respond(self, messages)
+
+    SleepyChatModel._respond = counting
+
+
+def build(full: bool, concurrency: int) -> dict:
+    clear_caches()
+    before = llm_calls["count"]
+    start = time.perf_counter()
+    precompute.main(max_concurrency=concurrency, full=full)
+    return {"seconds": round(time.perf_counter() - start, 2), "llm_calls": llm_calls["count"] - before}
+
+
+async def time_requests(quizzes: List[str], lookup: bool) -> dict:
+    os.environ["PRECOMPUTED_LOOKUP"] = "1" if lookup else "0"
+    precomputed._table = None
+    precomputed._absent_until = 0.0
+    clear_caches()
+    transport = httpx.ASGITransport(app=api_main.app)
+    latencies = []
+    async with api_main.app.router.lifespan_context(api_main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for quiz in quizzes:
+                start = time.perf_counter()
+                response = await client.post("/api/recommend", json={"formatted_quiz": quiz})
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+                if len(response.json()["products"]) != recommendation_agent.RECOMMENDATION_TOP_K:
+                    raise RuntimeError("Response is missing products")
+    return {
+        "lookup": lookup,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(precomputed.PRECOMPUTED_PATH + suffix):
+            os.remove(precomputed.PRECOMPUTED_PATH + suffix)
+    install_fakes(args.llm_latency, args.search_latency)
+    precompute.warm_up = lambda: 0.0
+    count_llm_calls()
+
+    first_build = build(full=True, concurrency=args.concurrency)
+    quizzes, _ = precompute.enumerate_profiles(precompute.load_quiz_space(precompute.QUIZ_SPACE_PATH),
+                                               precompute.PRECOMPUTE_MAX_PROFILES)
+    quizzes = [quizzes[i % len(quizzes)] for i in range(args.requests)]
+    latencies = [asyncio.run(time_requests(quizzes, lookup)) for lookup in (True, False)]
+
+    # The fake search returns P0..P4 for every query
+    diff = ManifestDiff()
+    diff.add(TEXT_CHANGED, "P1")
+    diff.add(NEW, "P9")
+    invalidated = precomputed.invalidate_precomputed(diff)
+    incremental = build(full=False, concurrency=args.concurrency)
+
+    print(json.dumps({
+        "profiles": len(precomputed.RecommendationTable(precomputed.PRECOMPUTED_PATH)),
+        "table_kb": round(os.path.getsize(precomputed.PRECOMPUTED_PATH) / 1024, 1),
+        "first_build": first_build,
+        "requests": latencies,
+        "speedup": round(latencies[1]["mean_ms"] / latencies[0]["mean_ms"], 1),
+        "reindex": {"invalidated": invalidated, "incremental_build": incremental},
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Throughput of ``run.py serve --production`` by worker count.
+
+Starts the fake upstreams from benchmarks.fake_upstreams, then for each
+worker count runs the production server against them and drives
+``/api/recommend`` with distinct quizzes. The app is CPU bound per process
+(prompt building, JSON parsing, graph overhead), so throughput should grow
+with workers up to the number of cores; past that it flattens.
+
+Each level then replays the same quizzes to check the caches: with the
+shared SQLite store every replay is a summary and explanation hit no matter
+which worker serves it, so ``replay_llm_calls`` stays near zero. With
+``--cache-backend memory`` a replay only hits when it lands on the worker
+that served the original, so about ``1 - 1/workers`` of them call the LLM.
+
+Usage: python -m benchmarks.serve_scaling --workers 1,2,4 --requests 300 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.retrieval.local_backend import catalog_paths, load_catalog
+from benchmarks.batch_throughput import sample_quizzes
+from benchmarks.fake_upstreams import OPENAI_ROUTES, PINECONE_ROUTES, FaultProfile, start_server, use_product_ids
+from benchmarks.load_test import drive_recommend, free_port
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_production(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "run.py", "serve", "--production", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers)],
+        cwd=ROOT, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            # The supervisor answers once the first worker is up; give the rest time to finish warming up
+            time.sleep(1.0 * workers)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 60s")
+
+
+def llm_calls(profile: FaultProfile) -> int:
+    return sum(count for route, count in profile.stats()["requests"].items() if "chat" in route)
+
+
+def run_level(workers: int, quizzes: List[str], concurrency: int, env: Dict[str, str],
+              openai_profile: FaultProfile) -> dict:
+    port = free_port()
+    server = start_production(port, workers, env)
+    try:
+        result = asyncio.run(drive_recommend(f"http://127.0.0.1:{port}", quizzes, concurrency))
+        before = llm_calls(openai_profile)
+        replay = asyncio.run(drive_recommend(f"http://127.0.0.1:{port}", quizzes, concurrency))
+        replay_calls = llm_calls(openai_profile) - before
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {
+        "workers": workers,
+        "requests": result["requests"],
+        "succeeded": result["succeeded"],
+        "errors": result["errors"],
+        "throughput_rps": result["throughput_rps"],
+        "latency_ms": result["latency_ms"],
+        "replay_throughput_rps": replay["throughput_rps"],
+        "replay_llm_calls": replay_calls,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default=None, help="Comma-separated worker counts (default: 1 up to the core count)")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per worker count")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--openai-latency", default="lognormal:0.4,0.4")
+    parser.add_argument("--pinecone-latency", default="lognormal:0.05,0.3")
+    parser.add_argument("--cache-backend", choices=["sqlite", "memory"], default="sqlite")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        levels = [int(w) for w in args.workers.split(",")]
+    else:
+        levels = sorted({1, 2, cores} | {2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores})
+
+    use_product_ids(load_catalog(catalog_paths())["id"].astype(str).tolist())
+    openai_profile = FaultProfile(args.openai_latency, seed=args.seed)
+    openai = start_server(OPENAI_ROUTES, openai_profile)
+    pinecone = start_server(PINECONE_ROUTES, FaultProfile(args.pinecone_latency, seed=args.seed + 1))
+    pinecone_url = f"http://127.0.0.1:{pinecone.server_address[1]}"
+
+    report = {
+        "config": {
+            "cores": cores,
+            "cache_backend": args.cache_backend,
+            "concurrency": args.concurrency,
+            "requests_per_level": args.requests,
+            "openai_latency": args.openai_latency,
+            "pinecone_latency": args.pinecone_latency,
+        },
+        "levels": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in levels:
+            env = {
+                "OPENAI_API_KEY": "serve-scaling",
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{openai.server_address[1]}/v1",
+                "PINECONE_API_KEY": "serve-scaling",
+                "PINECONE_INDEX_HOST": pinecone_url,
+                "PINECONE_EMBED_URL": f"{pinecone_url}/embed",
+                "RETRIEVAL_BACKEND": "pinecone",
+                "CACHE_BACKEND": args.cache_backend,
+                # A fresh cache file per level so the first pass is cold
+                "CACHE_PATH": os.path.join(tmp, f"cache-{workers}.sqlite3"),
+            }
+            # A nonce per level keeps quizzes from earlier levels out of the caches
+            quizzes = [f"{quiz}\nPedido: {workers}-{i}"
+                       for i, quiz in enumerate(sample_quizzes(args.requests, seed=args.seed))]
+            result = run_level(workers, quizzes, args.concurrency, env, openai_profile)
+            print(f"workers={workers}: {result['throughput_rps']} req/s, "
+                  f"{result['replay_llm_calls']} LLM calls on replay", file=sys.stderr)
+            report["levels"].append(result)
+
+    baseline = report["levels"][0]["throughput_rps"] or 1.0
+    for level in report["levels"]:
+        level["speedup"] = round(level["throughput_rps"] / baseline, 2)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
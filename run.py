@@ -1,19 +1,77 @@
+import os
 import argparse
 import uvicorn
 from app.indexing.pinecone_indexer import main as run_indexing
+from app.api.batch import main as run_batch
+from app.api.precompute import main as run_precompute
 
 def main():
     parser = argparse.ArgumentParser(description="Pet Quiz Backend")
-    parser.add_argument("action", choices=["index", "serve"], help="Action to perform")
+    parser.add_argument("action", choices=["index", "serve", "batch", "precompute"], help="Action to perform")
     parser.add_argument("--host", default="0.0.0.0", help="Host for the server")
     parser.add_argument("--port", type=int, default=8000, help="Port for the server")
+    parser.add_argument("--input", help="JSON lines file of quizzes for the batch action")
+    parser.add_argument("--output", help="Where the batch action writes JSON lines results (default: stdout)")
+    parser.add_argument("--concurrency", type=int, help="Concurrent LLM/search calls for the batch and precompute actions")
+    parser.add_argument("--batch-size", type=int, help="Records per upsert request when indexing")
+    parser.add_argument("--workers", type=int,
+                        help="Concurrent upsert workers when indexing; server processes with serve --production")
+    parser.add_argument("--rate", type=float, help="Maximum upsert requests per second when indexing")
+    parser.add_argument("--csv", nargs="+", help="Catalog CSV files to index (defaults to CATALOG_PATHS)")
+    parser.add_argument("--vectors", action="store_true", default=None,
+                        help="Upsert raw vectors from the local embedding cache instead of upsert_records")
+    parser.add_argument("--dry-run", action="store_true", help="Print the index or precompute changes without writing them")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the index manifest and re-upsert every product; recompute every profile")
+    parser.add_argument("--space", help="Quiz answer space JSON for the precompute action (defaults to QUIZ_SPACE_PATH)")
+    parser.add_argument("--max-profiles", type=int, help="Sample this many profiles when the answer space is larger")
+    parser.add_argument("--production", action="store_true",
+                        help="Serve with several worker processes and no reloader")
 
     args = parser.parse_args()
 
     if args.action == "index":
-        run_indexing()
+        run_indexing(
+            batch_size=args.batch_size,
+            max_workers=args.workers,
+            requests_per_second=args.rate,
+            dry_run=args.dry_run,
+            full=args.full,
+            csv_paths=args.csv,
+            use_vectors=args.vectors,
+        )
+    elif args.action == "batch":
+        if not args.input:
+            parser.error("batch requires --input")
+        run_batch(args.input, output_path=args.output, max_concurrency=args.concurrency)
+    elif args.action == "precompute":
+        run_precompute(
+            space_path=args.space,
+            max_profiles=args.max_profiles,
+            max_concurrency=args.concurrency,
+            full=args.full,
+            dry_run=args.dry_run,
+        )
+    elif args.action == "serve" and args.production:
+        serve_production(args.host, args.port, args.workers)
     elif args.action == "serve":
         uvicorn.run("app.api.main:app", host=args.host, port=args.port, reload=True)
 
+def serve_production(host: str, port: int, workers: int = None):
+    workers = workers or int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+    if workers > 1:
+        # Per-process caches would split the hit rate across workers
+        os.environ.setdefault("CACHE_BACKEND", "sqlite")
+        # Metrics are not shared the same way: each /metrics scrape reports
+        # only the worker that happens to answer it
+        print(f"Serving with {workers} workers; /metrics reports one worker per scrape")
+    # Workers are spawned, not forked, so nothing imported here is shared.
+    # Importing the app first still fails fast on a broken configuration
+    # before any worker starts; each worker then builds the graph, clients
+    # and catalog in its lifespan before it accepts connections.
+    import app.api.main  # noqa: F401
+    uvicorn.run("app.api.main:app", host=host, port=port, workers=workers, reload=False,
+                access_log=False, timeout_graceful_shutdown=30)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,80 @@
+"""In-process stand-ins for the chat model and product search.
+
+Shared by the tests and the benchmarks, so neither needs OpenAI or Pinecone.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class SleepyChatModel(BaseChatModel):
+    latency: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "sleepy-fake"
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        if "Perfiles:" in prompt:
+            profiles, _ = json.JSONDecoder().raw_decode(prompt, prompt.index("[", prompt.index("Perfiles:")))
+            content = json.dumps([
+                {"perfil": profile["perfil"], "id": product["id"],
+                 "explanation_es": "Ideal para tu mascota.", "explanation_en": "Great for your pet."}
+                for profile in profiles for product in profile["productos"]
+            ])
+        elif "Productos:" in prompt:
+            ids = re.findall(r'"id": "([^"]+)"', prompt)
+            content = json.dumps([
+                {"id": i, "explanation_es": "Ideal para tu mascota.", "explanation_en": "Great for your pet."}
+                for i in ids
+            ])
+        else:
+            # Echo a digest of the quiz so every profile gets its own summary
+            digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+            content = json.dumps({"summary_es": f"Juguete resistente para perro grande {digest}",
+                                  "summary_en": f"Durable toy for a large dog {digest}"})
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        # Spread the latency over small chunks, like a token stream
+        content = self._respond(messages).generations[0].message.content
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        for piece in pieces:
+            await asyncio.sleep(self.latency / len(pieces))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+
+def is_explanation_prompt(messages: List[BaseMessage]) -> bool:
+    prompt = "\n".join(str(m.content) for m in messages)
+    return "Productos:" in prompt or "Perfiles:" in prompt
+
+
+def make_fake_search(latency: float):
+    async def fake_search(query: str, top_k: int = 5) -> List[dict]:
+        await asyncio.sleep(latency)
+        return [
+            {"id": f"P{i}", "score": 1.0 - i / 10, "name": f"Product {i}", "price": 9.99,
+             "image_url": "", "product_link": "", "description": "Durable rubber ball", "search_query": ""}
+            for i in range(top_k)
+        ]
+
+    return fake_search
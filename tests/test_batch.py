@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.api import recommendation_agent
+from tests.fakes import SleepyChatModel, is_explanation_prompt, make_fake_search
+
+
+class FailingSummaryModel(SleepyChatModel):
+    def _respond(self, messages):
+        if not is_explanation_prompt(messages):
+            raise RuntimeError("summarizer down")
+        return super()._respond(messages)
+
+
+def test_degraded_profiles_search_their_own_answers(monkeypatch):
+    queries = []
+
+    async def fake_search(query, top_k=5):
+        queries.append(query)
+        return [{"id": f"{query}-{i}", "score": 1.0, "name": "", "price": 0.0, "image_url": "",
+                 "product_link": "", "description": "", "search_query": ""} for i in range(top_k)]
+
+    model = FailingSummaryModel(latency=0.0)
+    monkeypatch.setattr(recommendation_agent, "get_chat_model", lambda *args, **kwargs: model)
+    monkeypatch.setattr(recommendation_agent, "asearch_products", fake_search)
+    recommendation_agent.summary_cache.clear()
+    recommendation_agent.explanation_cache.clear()
+
+    quizzes = ["¿Qué tipo de mascota tienes?: Gato\n¿De qué tamaño es tu mascota?: Pequeño",
+               "¿Qué tipo de mascota tienes?: Perro\n¿De qué tamaño es tu mascota?: Grande"]
+
+    async def run():
+        return [result async for result in recommendation_agent.abatch_pet_recommendations(quizzes)]
+
+    results = sorted(asyncio.run(run()), key=lambda result: result["index"])
+
+    assert sorted(queries) == ["Gato. Pequeño", "Perro. Grande"]
+    assert [result["degraded"] for result in results] == [["summarize"], ["summarize"]]
+    assert results[0]["products"][0]["id"] != results[1]["products"][0]["id"]
+
+
+class EchoingExplanationModel(SleepyChatModel):
+    explanation_calls: int = 0
+
+    def _respond(self, messages):
+        prompt = "\n".join(str(m.content) for m in messages)
+        if "Perfiles:" not in prompt:
+            return super()._respond(messages)
+        self.explanation_calls += 1
+        profiles, _ = json.JSONDecoder().raw_decode(prompt, prompt.index("[", prompt.index("Perfiles:")))
+        # Explain each product with its own profile's need, so a mix-up shows
+        content = json.dumps([
+            {"perfil": profile["perfil"], "id": product["id"],
+             "explanation_es": profile["necesidades_es"], "explanation_en": profile["necesidades_en"]}
+            for profile in reversed(profiles) for product in profile["productos"]
+        ])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+def test_profiles_share_grouped_explanation_calls(monkeypatch):
+    model = EchoingExplanationModel(latency=0.0)
+    monkeypatch.setattr(recommendation_agent, "get_chat_model", lambda *args, **kwargs: model)
+    monkeypatch.setattr(recommendation_agent, "asearch_products", make_fake_search(0.0))
+    monkeypatch.setattr(recommendation_agent, "EXPLANATION_GROUP_SIZE", 4)
+    recommendation_agent.summary_cache.clear()
+    recommendation_agent.explanation_cache.clear()
+
+    quizzes = [f"¿Qué tipo de mascota tienes?: Perro {i}" for i in range(8)]
+
+    async def run():
+        return [result async for result in recommendation_agent.abatch_pet_recommendations(quizzes)]
+
+    results = asyncio.run(run())
+
+    assert len(results) == len(quizzes)
+    assert model.explanation_calls == 2
+    for result in results:
+        assert not result["degraded"]
+        assert all(product["explanation_es"] == result["summary_es"] for product in result["products"])
+
+
+def test_failed_search_is_reported_as_degraded(monkeypatch):
+    async def failing_search(query, top_k=5):
+        raise RuntimeError("index down")
+
+    model = SleepyChatModel(latency=0.0)
+    monkeypatch.setattr(recommendation_agent, "get_chat_model", lambda *args, **kwargs: model)
+    monkeypatch.setattr(recommendation_agent, "asearch_products", failing_search)
+    recommendation_agent.summary_cache.clear()
+    recommendation_agent.reset_pet_recommendation_graph()
+
+    result = asyncio.run(recommendation_agent.arecommend("¿Qué tipo de mascota tienes?: Perro"))
+
+    assert result["products"] == []
+    assert result["degraded"] == ["search_products"]
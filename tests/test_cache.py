@@ -0,0 +1,61 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from app.utils.cache import SQLiteCache
+
+
+def test_locked_sqlite_cache_does_not_block_callers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteCache(path, "summary_cache", maxsize=10)
+    cache.set("warm", ["es", "en"])
+    cache.flush()
+
+    # Another worker holds the write lock
+    other_worker = sqlite3.connect(path, isolation_level=None)
+    other_worker.execute("BEGIN EXCLUSIVE")
+    try:
+        start = time.perf_counter()
+        assert cache.get("warm") == ["es", "en"]
+        # A worker opening its connection while the lock is held
+        assert SQLiteCache(path, "summary_cache").get("warm") in (None, ["es", "en"])
+        cache.set("queued", ["es", "en"])
+        assert time.perf_counter() - start < 0.5
+    finally:
+        other_worker.execute("ROLLBACK")
+        other_worker.close()
+
+    cache.flush()
+    assert cache.get("queued") == ["es", "en"]
+
+
+def test_sqlite_cache_errors_count_as_misses(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    path.write_bytes(b"not a database" * 100)
+    cache = SQLiteCache(str(path), "summary_cache")
+    assert cache.get("key", "default") == "default"
+    cache.set("key", "value")
+    cache.flush()
+    assert cache.errors == 2
+
+
+def test_async_reads_run_off_the_event_loop(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), "explanation_cache")
+    cache.set(["need", "P1"], ["es", "en"])
+    cache.flush()
+    threads = []
+    read = cache.get_many
+
+    def recording_read(keys):
+        threads.append(threading.current_thread())
+        return read(keys)
+
+    cache.get_many = recording_read
+
+    async def scenario():
+        return await cache.aget_many([("need", "P0"), ("need", "P1")]), await cache.aget(("need", "P1"))
+
+    assert asyncio.run(scenario()) == ([None, ["es", "en"]], ["es", "en"])
+    assert threads and threading.main_thread() not in threads
+    assert (cache.hits, cache.misses) == (2, 1)
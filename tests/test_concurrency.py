@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+from app.api import recommendation_agent
+from app.utils.metrics import request_setup_duration
+from tests.fakes import SleepyChatModel, make_fake_search
+
+CONCURRENCY = 10
+
+
+def test_concurrent_requests_take_about_as_long_as_one(monkeypatch):
+    model = SleepyChatModel(latency=0.1)
+    monkeypatch.setattr(recommendation_agent, "get_chat_model", lambda *args, **kwargs: model)
+    monkeypatch.setattr(recommendation_agent, "asearch_products", make_fake_search(0.05))
+    recommendation_agent.reset_pet_recommendation_graph()
+    recommendation_agent.summary_cache.clear()
+    recommendation_agent.explanation_cache.clear()
+
+    async def timed(count: int, tag: str) -> float:
+        # A distinct quiz per request keeps the caches and single-flight out of it
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            recommendation_agent.arecommend(f"¿Qué tipo de mascota tienes?: Perro {tag}-{i}")
+            for i in range(count)
+        ])
+        elapsed = time.perf_counter() - start
+        assert all(len(result["products"]) == recommendation_agent.RECOMMENDATION_TOP_K for result in results)
+        assert not any(result.get("degraded") for result in results)
+        return elapsed
+
+    async def scenario():
+        await timed(1, "warm")
+        single = await timed(1, "single")
+        concurrent = await timed(CONCURRENCY, "concurrent")
+        return single, concurrent
+
+    setup = request_setup_duration.labels()
+    calls_before, seconds_before = sum(setup.counts), setup.sum
+    single, concurrent = asyncio.run(scenario())
+    # A blocking stage would serialize the requests, costing about CONCURRENCY times one
+    assert concurrent < single * 1.5
+    # Setup is measured per request and stays far below the request itself
+    calls = sum(setup.counts) - calls_before
+    assert calls == CONCURRENCY + 2
+    assert (setup.sum - seconds_before) / calls < 0.005
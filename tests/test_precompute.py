@@ -0,0 +1,47 @@
+import asyncio
+
+from app.api.precompute import is_complete
+from app.api.recommendation_agent import EXPLANATION_TEMPLATE_ES, RECOMMENDATION_TOP_K
+from app.utils import precomputed
+from app.utils.precomputed import RecommendationTable
+
+
+def result(**explanations):
+    products = [{"id": f"P{i}", "explanation_es": "Ideal.", "explanation_en": "Great."}
+                for i in range(RECOMMENDATION_TOP_K)]
+    products[0] = {"id": "P0", **explanations}
+    return {"summary_es": "es", "summary_en": "en", "products": products, "degraded": []}
+
+
+def test_only_fully_explained_results_are_stored():
+    assert is_complete(result(explanation_es="Ideal.", explanation_en="Great."))
+    assert not is_complete(result())
+    assert not is_complete(result(explanation_es="Ideal."))
+    assert not is_complete(result(explanation_es=EXPLANATION_TEMPLATE_ES, explanation_en="Great."))
+
+
+def test_invalidated_profiles_are_not_served(tmp_path):
+    table = RecommendationTable(str(tmp_path / "precomputed.sqlite3"))
+    stored = result(explanation_es="Ideal.", explanation_en="Great.")
+    table.put("quiz a", stored)
+    table.put("quiz b", {**stored, "products": stored["products"][1:]})
+    assert table.get("Quiz   A")["products"] == stored["products"]
+
+    assert table.invalidate(["P0"], [], added=True) == {"invalid": 1, "outdated": 1}
+    assert table.get("quiz a") is None
+    assert table.get("quiz b") is not None
+
+
+def test_missing_table_is_not_looked_for_on_every_request(tmp_path, monkeypatch):
+    path = str(tmp_path / "precomputed.sqlite3")
+    monkeypatch.setattr(precomputed, "PRECOMPUTED_PATH", path)
+    monkeypatch.setattr(precomputed, "_table", None)
+    monkeypatch.setattr(precomputed, "_absent_until", 0.0)
+    assert asyncio.run(precomputed.alookup_precomputed("quiz a")) is None
+
+    RecommendationTable(path).put("quiz a", result(explanation_es="Ideal.", explanation_en="Great."))
+    assert asyncio.run(precomputed.alookup_precomputed("quiz a")) is None
+
+    # Once the recheck interval has passed the new table is served
+    monkeypatch.setattr(precomputed, "_absent_until", 0.0)
+    assert asyncio.run(precomputed.alookup_precomputed("quiz a"))["products"][0]["id"] == "P0"
@@ -0,0 +1,143 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils.resilience import CircuitBreaker, CircuitOpenError, UpstreamPolicy
+
+
+def make_policy(name: str) -> UpstreamPolicy:
+    policy = UpstreamPolicy(name, "test", max_retries=0)
+    policy.breaker = CircuitBreaker(name, failure_threshold=1, reset_timeout=0.0)
+    return policy
+
+
+def trip(policy: UpstreamPolicy):
+    def fail():
+        raise httpx.ConnectError("down")
+
+    with pytest.raises(httpx.ConnectError):
+        policy.call(fail)
+    assert policy.breaker.state == CircuitBreaker.OPEN
+
+
+async def ok():
+    return "ok"
+
+
+def test_cancelled_trial_releases_the_half_open_slot():
+    policy = make_policy("cancelled-trial")
+    trip(policy)
+
+    async def scenario():
+        # The trial overruns its stage budget and is cancelled by wait_for
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(policy.acall(lambda: asyncio.sleep(1)), 0.01)
+        assert not policy.breaker._trial_in_flight
+        return await policy.acall(ok)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_transient_trial_error_releases_the_half_open_slot():
+    policy = make_policy("non-transient-trial")
+    trip(policy)
+
+    async def bad_request():
+        raise ValueError("not the upstream's fault")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await policy.acall(bad_request)
+        return await policy.acall(ok)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_sync_trial_error_releases_the_half_open_slot():
+    policy = make_policy("sync-trial")
+    trip(policy)
+
+    def bad_request():
+        raise ValueError("not the upstream's fault")
+
+    with pytest.raises(ValueError):
+        policy.call(bad_request)
+    assert policy.call(lambda: "ok") == "ok"
+
+
+def test_concurrent_call_is_refused_while_the_trial_runs():
+    policy = make_policy("busy-trial")
+    trip(policy)
+
+    async def scenario():
+        trial = asyncio.ensure_future(policy.acall(lambda: asyncio.sleep(0.05, result="trial")))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await policy.acall(ok)
+        return await trial
+
+    assert asyncio.run(scenario()) == "trial"
+
+
+class RateLimited(Exception):
+    status = 429
+
+
+def test_rate_limits_do_not_trip_the_breaker():
+    policy = make_policy("rate-limited")
+
+    def throttled():
+        raise RateLimited()
+
+    with pytest.raises(RateLimited):
+        policy.call(throttled)
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_sync_call_waits_out_an_open_circuit_within_its_budget():
+    policy = make_policy("reopening")
+    policy.breaker.reset_timeout = 0.1
+    policy.budget = 2.0
+    trip(policy)
+    assert policy.call(lambda: "ok") == "ok"
+
+    policy.budget = 0.05
+    trip(policy)
+    with pytest.raises(CircuitOpenError):
+        policy.call(lambda: "ok")
+
+
+def hedging_policy(name: str) -> UpstreamPolicy:
+    policy = UpstreamPolicy(name, "test", hedge=True, hedge_initial_delay=0.02, max_retries=0)
+    policy.breaker = CircuitBreaker(name, failure_threshold=1, reset_timeout=60.0)
+    return policy
+
+
+def test_backup_wins_when_the_original_is_slow():
+    policy = hedging_policy("hedge-wins")
+    delays = [0.5, 0.0]
+
+    async def call():
+        await asyncio.sleep(delays.pop(0))
+        return "done"
+
+    assert asyncio.run(asyncio.wait_for(policy.acall(call), 0.3)) == "done"
+    assert delays == []
+
+
+def test_no_backup_while_the_circuit_is_open():
+    policy = hedging_policy("hedge-open")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        # Another request trips the breaker while this one is in flight
+        policy.breaker.record_failure()
+        await asyncio.sleep(0.05)
+        return "done"
+
+    assert asyncio.run(policy.acall(call)) == "done"
+    assert len(calls) == 1
@@ -0,0 +1,41 @@
+import asyncio
+
+from app.utils.singleflight import SingleFlight
+
+
+def test_short_deadline_does_not_set_the_budget_of_longer_callers():
+    flight = SingleFlight("test")
+    budgets = []
+
+    async def work(budget):
+        budgets.append(budget)
+        await asyncio.sleep(0.01)
+        return budget
+
+    async def scenario():
+        return await asyncio.gather(
+            flight.do("quiz", lambda: work(0.05), budget=0.05),
+            flight.do("quiz", lambda: work(10.0), budget=10.0),
+            flight.do("quiz", lambda: work(10.0), budget=10.0),
+            flight.do("quiz", lambda: work(0.02), budget=0.02),
+        )
+
+    results = asyncio.run(scenario())
+    # The long callers share one run with their own budget; the 20 ms
+    # caller cannot wait for the 50 ms run, so it gets its own
+    assert results == [0.05, 10.0, 10.0, 0.02]
+    assert budgets == [0.05, 10.0, 0.02]
+    assert flight.saved == 1
+    assert len(flight) == 0
+
+
+def test_unbounded_callers_only_join_unbounded_runs():
+    flight = SingleFlight("test")
+
+    async def scenario():
+        return await asyncio.gather(
+            flight.do("quiz", lambda: asyncio.sleep(0.01, result="bounded"), budget=1.0),
+            flight.do("quiz", lambda: asyncio.sleep(0.01, result="unbounded")),
+        )
+
+    assert asyncio.run(scenario()) == ["bounded", "unbounded"]